@@ -0,0 +1,42 @@
+"""copy-on-write plans
+
+Revision ID: 1719e33a4c93
+Revises: f65c28b14eaf
+Create Date: 2026-10-17 10:12:41.318520
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "1719e33a4c93"
+down_revision: Union[str, Sequence[str], None] = "f65c28b14eaf"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "plans",
+        sa.Column(
+            "copy_on_write",
+            sa.Boolean(),
+            nullable=False,
+            server_default=sa.text("false"),
+        ),
+    )
+    op.add_column("weeks", sa.Column("base_week_id", sa.Integer(), nullable=True))
+    op.create_foreign_key(
+        "weeks_base_week_id_fkey", "weeks", "weeks", ["base_week_id"], ["id"]
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint("weeks_base_week_id_fkey", "weeks", type_="foreignkey")
+    op.drop_column("weeks", "base_week_id")
+    op.drop_column("plans", "copy_on_write")
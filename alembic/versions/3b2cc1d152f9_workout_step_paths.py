@@ -0,0 +1,70 @@
+"""workout step paths
+
+Revision ID: 3b2cc1d152f9
+Revises: 1719e33a4c93
+Create Date: 2026-10-17 11:02:17.904133
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "3b2cc1d152f9"
+down_revision: Union[str, Sequence[str], None] = "1719e33a4c93"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("workout_steps", sa.Column("path", sa.String(), nullable=True))
+
+    # backfill: one zero-padded sibling position per level, root first
+    op.execute(
+        """
+        WITH RECURSIVE positioned AS (
+            SELECT
+                id,
+                step_id,
+                lpad(
+                    row_number() OVER (
+                        PARTITION BY workout_id, step_id ORDER BY "order", id
+                    )::text,
+                    4,
+                    '0'
+                ) AS segment
+            FROM workout_steps
+        ),
+        tree AS (
+            SELECT id, segment AS path
+            FROM positioned
+            WHERE step_id IS NULL
+            UNION ALL
+            SELECT p.id, t.path || '.' || p.segment
+            FROM positioned p
+            JOIN tree t ON p.step_id = t.id
+        )
+        UPDATE workout_steps
+        SET path = tree.path
+        FROM tree
+        WHERE workout_steps.id = tree.id
+        """
+    )
+
+    op.alter_column("workout_steps", "path", existing_type=sa.String(), nullable=False)
+    op.create_index(
+        "ix_workout_steps_workout_id_path",
+        "workout_steps",
+        ["workout_id", "path"],
+        unique=False,
+        postgresql_ops={"path": "text_pattern_ops"},
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_workout_steps_workout_id_path", table_name="workout_steps")
+    op.drop_column("workout_steps", "path")
@@ -0,0 +1,116 @@
+"""plan json functions
+
+Revision ID: 6246270eed4a
+Revises: 3b2cc1d152f9
+Create Date: 2026-10-17 12:20:05.551207
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "6246270eed4a"
+down_revision: Union[str, Sequence[str], None] = "3b2cc1d152f9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # plpgsql: the body may call the function itself, which a sql function
+    # can't do at creation time. Enum labels are stored by name (WARM_UP),
+    # the API speaks values (WARM UP).
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION workout_steps_json(
+            p_workout_id integer, p_parent_id integer
+        )
+        RETURNS jsonb
+        LANGUAGE plpgsql
+        STABLE
+        AS $$
+        BEGIN
+            RETURN (
+                SELECT coalesce(
+                    jsonb_agg(
+                        jsonb_build_object(
+                            'id', s.id,
+                            'name', s.name,
+                            'description', s.description,
+                            'order', s."order",
+                            'value', s.value,
+                            'type', replace(s.type::text, '_', ' '),
+                            'repetitions', s.repetitions,
+                            'step_id', s.step_id,
+                            'steps', workout_steps_json(p_workout_id, s.id)
+                        )
+                        ORDER BY s.path
+                    ),
+                    '[]'::jsonb
+                )
+                FROM workout_steps s
+                WHERE s.workout_id = p_workout_id
+                AND s.step_id IS NOT DISTINCT FROM p_parent_id
+            );
+        END;
+        $$
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION week_json(p_week_id integer)
+        RETURNS jsonb
+        LANGUAGE sql
+        STABLE
+        AS $$
+            SELECT jsonb_build_object(
+                'id', w.id,
+                'order', w."order",
+                'base_week_id', w.base_week_id,
+                'days', coalesce(
+                    (
+                        SELECT jsonb_agg(
+                            jsonb_build_object(
+                                'id', d.id,
+                                'day_of_week', d.day_of_week,
+                                'order', d."order",
+                                'workouts', coalesce(
+                                    (
+                                        SELECT jsonb_agg(
+                                            jsonb_build_object(
+                                                'id', wo.id,
+                                                'title', wo.title,
+                                                'description', wo.description,
+                                                'order', wo."order",
+                                                'type', wo.type::text,
+                                                'steps', workout_steps_json(wo.id, NULL)
+                                            )
+                                            ORDER BY wo."order"
+                                        )
+                                        FROM workouts wo
+                                        WHERE wo.day_id = d.id
+                                    ),
+                                    '[]'::jsonb
+                                )
+                            )
+                            ORDER BY d."order"
+                        )
+                        FROM days d
+                        WHERE d.week_id = w.id
+                    ),
+                    '[]'::jsonb
+                )
+            )
+            FROM weeks w
+            WHERE w.id = p_week_id
+        $$
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP FUNCTION IF EXISTS week_json(integer)")
+    op.execute("DROP FUNCTION IF EXISTS workout_steps_json(integer, integer)")
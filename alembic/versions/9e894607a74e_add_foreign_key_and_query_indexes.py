@@ -0,0 +1,70 @@
+"""add foreign key and query indexes
+
+Revision ID: 9e894607a74e
+Revises: a8e72416e598
+Create Date: 2026-10-17 16:21:47.530918
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9e894607a74e"
+down_revision: Union[str, Sequence[str], None] = "a8e72416e598"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (name, table, columns), matching the index definitions in models/index.py
+INDEXES = [
+    ("ix_athlete_plans_athlete_id", "athlete_plans", ["athlete_id"]),
+    ("ix_athlete_plans_plan_id", "athlete_plans", ["plan_id"]),
+    ("ix_athletes_user_id", "athletes", ["user_id"]),
+    ("ix_coaches_user_id", "coaches", ["user_id"]),
+    ("ix_conversations_recipient_id", "conversations", ["recipient_id"]),
+    ("ix_conversations_user_id", "conversations", ["user_id"]),
+    ("ix_days_week_id", "days", ["week_id"]),
+    (
+        "ix_messages_conversation_id_created_at",
+        "messages",
+        ["conversation_id", "created_at"],
+    ),
+    ("ix_plan_templates_coach_id", "plan_templates", ["coach_id"]),
+    ("ix_plan_templates_level_type_id", "plan_templates", ["level", "type", "id"]),
+    ("ix_plans_coach_id", "plans", ["coach_id"]),
+    ("ix_weeks_plan_id_order", "weeks", ["plan_id", "order"]),
+    ("ix_weeks_template_id_order", "weeks", ["template_id", "order"]),
+    ("ix_workout_steps_step_id", "workout_steps", ["step_id"]),
+    ("ix_workouts_day_id", "workouts", ["day_id"]),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # built concurrently so live tables keep taking writes; that can't run
+    # inside the migration transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                unique=False,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name=table,
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
@@ -0,0 +1,108 @@
+"""add weeks count to plan templates
+
+Revision ID: 9f8fa61ff12d
+Revises: f81037c57f75
+Create Date: 2026-10-17 14:25:09.671480
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "9f8fa61ff12d"
+down_revision: Union[str, Sequence[str], None] = "f81037c57f75"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "plan_templates",
+        sa.Column("weeks_count", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.execute(
+        """
+        UPDATE plan_templates pt
+        SET weeks_count = counts.weeks_count
+        FROM (
+            SELECT template_id, count(*) AS weeks_count
+            FROM weeks
+            WHERE template_id IS NOT NULL
+            GROUP BY template_id
+        ) counts
+        WHERE pt.id = counts.template_id
+        """
+    )
+
+    # statement level triggers: a bulk insert of weeks costs one update
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION weeks_count_after_insert()
+        RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        BEGIN
+            UPDATE plan_templates pt
+            SET weeks_count = pt.weeks_count + counts.weeks_count
+            FROM (
+                SELECT template_id, count(*) AS weeks_count
+                FROM new_weeks
+                WHERE template_id IS NOT NULL
+                GROUP BY template_id
+            ) counts
+            WHERE pt.id = counts.template_id;
+            RETURN NULL;
+        END;
+        $$
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION weeks_count_after_delete()
+        RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        BEGIN
+            UPDATE plan_templates pt
+            SET weeks_count = pt.weeks_count - counts.weeks_count
+            FROM (
+                SELECT template_id, count(*) AS weeks_count
+                FROM old_weeks
+                WHERE template_id IS NOT NULL
+                GROUP BY template_id
+            ) counts
+            WHERE pt.id = counts.template_id;
+            RETURN NULL;
+        END;
+        $$
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER weeks_count_insert
+        AFTER INSERT ON weeks
+        REFERENCING NEW TABLE AS new_weeks
+        FOR EACH STATEMENT EXECUTE FUNCTION weeks_count_after_insert()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER weeks_count_delete
+        AFTER DELETE ON weeks
+        REFERENCING OLD TABLE AS old_weeks
+        FOR EACH STATEMENT EXECUTE FUNCTION weeks_count_after_delete()
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS weeks_count_delete ON weeks")
+    op.execute("DROP TRIGGER IF EXISTS weeks_count_insert ON weeks")
+    op.execute("DROP FUNCTION IF EXISTS weeks_count_after_delete()")
+    op.execute("DROP FUNCTION IF EXISTS weeks_count_after_insert()")
+    op.drop_column("plan_templates", "weeks_count")
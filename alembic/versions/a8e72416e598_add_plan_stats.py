@@ -0,0 +1,92 @@
+"""add plan stats
+
+Revision ID: a8e72416e598
+Revises: 9f8fa61ff12d
+Create Date: 2026-10-17 15:08:33.190274
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "a8e72416e598"
+down_revision: Union[str, Sequence[str], None] = "9f8fa61ff12d"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("weeks", sa.Column("stats", postgresql.JSONB(), nullable=True))
+    op.add_column(
+        "plan_templates", sa.Column("stats", postgresql.JSONB(), nullable=True)
+    )
+
+    # backfill, same computation as utils/plan_stats.py over every week
+    op.execute(
+        """
+        WITH RECURSIVE tree AS (
+            SELECT s.id, d.week_id, s.type, s.value, coalesce(s.repetitions, 1) AS multiplier
+            FROM workout_steps s
+            JOIN workouts wo ON wo.id = s.workout_id
+            JOIN days d ON d.id = wo.day_id
+            WHERE s.step_id IS NULL
+            UNION ALL
+            SELECT c.id, t.week_id, c.type, c.value, t.multiplier * coalesce(c.repetitions, 1)
+            FROM workout_steps c
+            JOIN tree t ON c.step_id = t.id
+        ),
+        totals AS (
+            SELECT
+                t.week_id,
+                sum(t.value * t.multiplier) FILTER (WHERE t.type = 'DISTANCE') AS distance,
+                sum(t.value * t.multiplier) FILTER (WHERE t.type = 'TIME') AS time,
+                sum(t.value * t.multiplier) FILTER (WHERE t.type = 'REPS') AS reps
+            FROM tree t
+            WHERE NOT EXISTS (SELECT 1 FROM workout_steps c WHERE c.step_id = t.id)
+            GROUP BY t.week_id
+        )
+        UPDATE weeks w
+        SET stats = jsonb_build_object(
+            'distance', coalesce(totals.distance, 0),
+            'time', coalesce(totals.time, 0),
+            'reps', coalesce(totals.reps, 0)
+        )
+        FROM weeks target
+        LEFT JOIN totals ON totals.week_id = target.id
+        WHERE w.id = target.id
+        """
+    )
+    op.execute(
+        """
+        WITH totals AS (
+            SELECT
+                template_id,
+                sum((stats->>'distance')::bigint) AS distance,
+                sum((stats->>'time')::bigint) AS time,
+                sum((stats->>'reps')::bigint) AS reps
+            FROM weeks
+            WHERE template_id IS NOT NULL
+            GROUP BY template_id
+        )
+        UPDATE plan_templates pt
+        SET stats = jsonb_build_object(
+            'distance', coalesce(totals.distance, 0),
+            'time', coalesce(totals.time, 0),
+            'reps', coalesce(totals.reps, 0)
+        )
+        FROM plan_templates target
+        LEFT JOIN totals ON totals.template_id = target.id
+        WHERE pt.id = target.id
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("plan_templates", "stats")
+    op.drop_column("weeks", "stats")
@@ -0,0 +1,128 @@
+"""add stats to week json
+
+Revision ID: e67af5ffc3ce
+Revises: fa4d138a2c6f
+Create Date: 2026-10-17 21:05:37.514208
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e67af5ffc3ce"
+down_revision: Union[str, Sequence[str], None] = "fa4d138a2c6f"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # the week rollups from utils/plan_stats.py, for the preview's first week
+    # and the weeks of /plans/{id}/full
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION week_json(p_week_id integer)
+        RETURNS jsonb
+        LANGUAGE sql
+        STABLE
+        AS $$
+            SELECT jsonb_build_object(
+                'id', w.id,
+                'order', w."order",
+                'base_week_id', w.base_week_id,
+                'stats', w.stats,
+                'days', coalesce(
+                    (
+                        SELECT jsonb_agg(
+                            jsonb_build_object(
+                                'id', d.id,
+                                'day_of_week', d.day_of_week,
+                                'order', d."order",
+                                'workouts', coalesce(
+                                    (
+                                        SELECT jsonb_agg(
+                                            jsonb_build_object(
+                                                'id', wo.id,
+                                                'title', wo.title,
+                                                'description', wo.description,
+                                                'order', wo."order",
+                                                'type', wo.type::text,
+                                                'steps', workout_steps_json(wo.id, NULL)
+                                            )
+                                            ORDER BY wo."order"
+                                        )
+                                        FROM workouts wo
+                                        WHERE wo.day_id = d.id
+                                    ),
+                                    '[]'::jsonb
+                                )
+                            )
+                            ORDER BY d."order"
+                        )
+                        FROM days d
+                        WHERE d.week_id = w.id
+                    ),
+                    '[]'::jsonb
+                )
+            )
+            FROM weeks w
+            WHERE w.id = p_week_id
+        $$
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION week_json(p_week_id integer)
+        RETURNS jsonb
+        LANGUAGE sql
+        STABLE
+        AS $$
+            SELECT jsonb_build_object(
+                'id', w.id,
+                'order', w."order",
+                'base_week_id', w.base_week_id,
+                'days', coalesce(
+                    (
+                        SELECT jsonb_agg(
+                            jsonb_build_object(
+                                'id', d.id,
+                                'day_of_week', d.day_of_week,
+                                'order', d."order",
+                                'workouts', coalesce(
+                                    (
+                                        SELECT jsonb_agg(
+                                            jsonb_build_object(
+                                                'id', wo.id,
+                                                'title', wo.title,
+                                                'description', wo.description,
+                                                'order', wo."order",
+                                                'type', wo.type::text,
+                                                'steps', workout_steps_json(wo.id, NULL)
+                                            )
+                                            ORDER BY wo."order"
+                                        )
+                                        FROM workouts wo
+                                        WHERE wo.day_id = d.id
+                                    ),
+                                    '[]'::jsonb
+                                )
+                            )
+                            ORDER BY d."order"
+                        )
+                        FROM days d
+                        WHERE d.week_id = w.id
+                    ),
+                    '[]'::jsonb
+                )
+            )
+            FROM weeks w
+            WHERE w.id = p_week_id
+        $$
+        """
+    )
@@ -0,0 +1,28 @@
+"""add lease token to outbox events
+
+Revision ID: f694ef1aba37
+Revises: e67af5ffc3ce
+Create Date: 2026-10-17 21:48:09.120733
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "f694ef1aba37"
+down_revision: Union[str, Sequence[str], None] = "e67af5ffc3ce"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("outbox_events", sa.Column("lease_token", sa.Uuid(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("outbox_events", "lease_token")
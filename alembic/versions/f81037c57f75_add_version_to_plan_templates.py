@@ -0,0 +1,31 @@
+"""add version to plan templates
+
+Revision ID: f81037c57f75
+Revises: 6246270eed4a
+Create Date: 2026-10-17 13:41:52.027341
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "f81037c57f75"
+down_revision: Union[str, Sequence[str], None] = "6246270eed4a"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "plan_templates",
+        sa.Column("version", sa.Integer(), nullable=False, server_default="1"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("plan_templates", "version")
@@ -0,0 +1,138 @@
+"""build workout steps json from one path scan
+
+Revision ID: fa4d138a2c6f
+Revises: 86309cca5c4c
+Create Date: 2026-10-17 18:40:12.208417
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "fa4d138a2c6f"
+down_revision: Union[str, Sequence[str], None] = "86309cca5c4c"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Same document as before, but from a single scan of the workout's steps
+    # in path order (ix_workout_steps_workout_id_path) instead of one lookup
+    # per node. Paths put parents right before their children, so a stack of
+    # open steps is enough to nest them.
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION workout_steps_json(
+            p_workout_id integer, p_parent_id integer
+        )
+        RETURNS jsonb
+        LANGUAGE plpgsql
+        STABLE
+        AS $$
+        DECLARE
+            v_prefix text := '';
+            v_base integer := 0;
+            v_depth integer := 0;
+            v_level integer;
+            -- v_nodes[d] is the open step at depth d, v_children[d + 1] collects
+            -- its steps; v_children[1] holds the top level
+            v_nodes jsonb[] := '{}';
+            v_children jsonb[] := ARRAY['[]'::jsonb];
+            s record;
+        BEGIN
+            IF p_parent_id IS NOT NULL THEN
+                SELECT path || '.', array_length(string_to_array(path, '.'), 1)
+                INTO v_prefix, v_base
+                FROM workout_steps
+                WHERE id = p_parent_id;
+
+                IF NOT FOUND THEN
+                    RETURN '[]'::jsonb;
+                END IF;
+            END IF;
+
+            FOR s IN
+                SELECT *
+                FROM workout_steps
+                WHERE workout_id = p_workout_id AND path LIKE v_prefix || '%'
+                ORDER BY path
+            LOOP
+                v_level := array_length(string_to_array(s.path, '.'), 1) - v_base;
+
+                -- close the open steps that aren't ancestors of this one
+                WHILE v_depth >= v_level LOOP
+                    v_children[v_depth] := v_children[v_depth] || jsonb_build_array(
+                        v_nodes[v_depth] || jsonb_build_object('steps', v_children[v_depth + 1])
+                    );
+                    v_depth := v_depth - 1;
+                END LOOP;
+
+                v_depth := v_level;
+                v_nodes[v_depth] := jsonb_build_object(
+                    'id', s.id,
+                    'name', s.name,
+                    'description', s.description,
+                    'order', s."order",
+                    'value', s.value,
+                    'type', replace(s.type::text, '_', ' '),
+                    'repetitions', s.repetitions,
+                    'step_id', s.step_id
+                );
+                v_children[v_depth + 1] := '[]'::jsonb;
+            END LOOP;
+
+            WHILE v_depth > 0 LOOP
+                v_children[v_depth] := v_children[v_depth] || jsonb_build_array(
+                    v_nodes[v_depth] || jsonb_build_object('steps', v_children[v_depth + 1])
+                );
+                v_depth := v_depth - 1;
+            END LOOP;
+
+            RETURN v_children[1];
+        END;
+        $$
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION workout_steps_json(
+            p_workout_id integer, p_parent_id integer
+        )
+        RETURNS jsonb
+        LANGUAGE plpgsql
+        STABLE
+        AS $$
+        BEGIN
+            RETURN (
+                SELECT coalesce(
+                    jsonb_agg(
+                        jsonb_build_object(
+                            'id', s.id,
+                            'name', s.name,
+                            'description', s.description,
+                            'order', s."order",
+                            'value', s.value,
+                            'type', replace(s.type::text, '_', ' '),
+                            'repetitions', s.repetitions,
+                            'step_id', s.step_id,
+                            'steps', workout_steps_json(p_workout_id, s.id)
+                        )
+                        ORDER BY s.path
+                    ),
+                    '[]'::jsonb
+                )
+                FROM workout_steps s
+                WHERE s.workout_id = p_workout_id
+                AND s.step_id IS NOT DISTINCT FROM p_parent_id
+            );
+        END;
+        $$
+        """
+    )
@@ -1,19 +1,97 @@
 from dotenv import load_dotenv
+from fastapi import Request, Response
 from sqlalchemy import create_engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker, declarative_base
 import os
 
+from utils.pool import InstrumentedPool, pool_options
+from utils.replicas import ReplicaSet
+from utils.query_stats import instrument
+
 load_dotenv()
 
-engine = create_engine(os.environ.get("DATABASE_URL"), pool_pre_ping=True)
+DATABASE_URL = os.environ.get("DATABASE_URL")
+# same database through the asyncpg driver unless configured separately
+ASYNC_DATABASE_URL = os.environ.get("ASYNC_DATABASE_URL") or make_url(DATABASE_URL).set(
+    drivername="postgresql+asyncpg"
+)
+
+# sync engine: Alembic, scripts and code that can't await yet
+engine = create_engine(DATABASE_URL, **pool_options())
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL, poolclass=InstrumentedPool, **pool_options()
+)
+# objects stay loaded after commit, an expired attribute can't lazy load
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+
+# comma separated, read-only routes are spread over these
+replicas = ReplicaSet(
+    [
+        create_async_engine(
+            make_url(url.strip()).set(drivername="postgresql+asyncpg"),
+            poolclass=InstrumentedPool,
+            connect_args={
+                "timeout": float(os.environ.get("DATABASE_REPLICA_CONNECT_TIMEOUT", 2))
+            },
+            **pool_options(),
+        )
+        for url in os.environ.get("DATABASE_REPLICA_URLS", "").split(",")
+        if url.strip()
+    ],
+    cooldown=float(os.environ.get("DATABASE_REPLICA_COOLDOWN", 30)),
+)
+# after a write the client reads from the primary for this long, so it
+# never sees a replica that hasn't caught up with its own changes yet
+PRIMARY_STICKY_COOKIE = "db_primary"
+PRIMARY_STICKY_SECONDS = int(os.environ.get("DATABASE_REPLICA_STICKY_SECONDS", 5))
+
+# per request SQL stats, see utils/query_stats.py
+instrument(engine)
+for instrumented in [async_engine, *replicas.engines]:
+    instrument(instrumented.sync_engine)
+
 Base = declarative_base()
 
 
 # Dependency for FastAPI
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db(request: Request, response: Response):
+    if replicas and request.method not in ("GET", "HEAD", "OPTIONS"):
+        response.set_cookie(
+            PRIMARY_STICKY_COOKIE,
+            "1",
+            max_age=PRIMARY_STICKY_SECONDS,
+            httponly=True,
+            samesite="lax",
+        )
+
+    async with AsyncSessionLocal() as db:
         yield db  # <-- works just like @contextmanager under the hood
-    finally:
-        db.close()
+
+
+# Dependency for read-only routes, served by a replica when one is available
+async def get_read_db(request: Request):
+    if replicas and PRIMARY_STICKY_COOKIE not in request.cookies:
+        while (index := replicas.pick()) is not None:
+            db = replicas.sessions[index]()
+            try:
+                # connect up front so an unreachable replica is skipped
+                # before the route starts querying it
+                await db.connection()
+            except (DBAPIError, OSError):
+                await db.close()
+                replicas.bench(index)
+                continue
+
+            async with db:
+                yield db
+            return
+
+    async with AsyncSessionLocal() as db:
+        yield db
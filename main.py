@@ -1,15 +1,25 @@
+from contextlib import asynccontextmanager, suppress
 from dotenv import load_dotenv
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, status
 from fastapi.middleware.cors import CORSMiddleware
 import os
-import json
+import logging
+import asyncio
+from utils.websocket import codec
 from utils.websocket.manager import manager
+from utils.websocket.write_buffer import message_buffer
 from utils.websocket.handlers import handler
 
-from utils.middleware import add_user_to_request
+from utils.middleware import (
+    add_user_to_request,
+    add_query_stats,
+    principal_from_token,
+)
 
 load_dotenv()
 
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"))
+
 DATABASE_URL = os.environ.get("DATABASE_URL")
 
 if not DATABASE_URL:
@@ -20,9 +30,30 @@ from routes.plans import router as plans_router
 from routes.users import router as auth_router
 from routes.coaches import router as coaches_router
 from routes.conversations import router as conversations_router
+from routes.metrics import router as metrics_router
+from utils.outbox import outbox
+from utils.email_queue import email_queue
+
+OUTBOX_SHUTDOWN_TIMEOUT = float(os.environ.get("OUTBOX_SHUTDOWN_TIMEOUT", 10))
+
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    dispatcher = asyncio.create_task(outbox.run())
+    await email_queue.start()
+    await manager.start()
+    await message_buffer.start()
+    yield
+    await message_buffer.stop()
+    await manager.stop()
+    await email_queue.stop()
+    outbox.stop()
+    # the batch in flight commits, or is rolled back past the timeout
+    with suppress(asyncio.TimeoutError, asyncio.CancelledError):
+        await asyncio.wait_for(dispatcher, OUTBOX_SHUTDOWN_TIMEOUT)
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -34,25 +65,41 @@ app.add_middleware(
 
 
 app.middleware("http")(add_user_to_request)
+app.middleware("http")(add_query_stats)
 
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+    # same cookie as the HTTP API, events are only sent to their participants
+    principal = principal_from_token(websocket.cookies.get("access_token"))
+    if not principal:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await manager.connect(websocket, principal.user_id)
     try:
         while True:
             data = await websocket.receive_text()
-            obj = json.loads(data)
+            try:
+                obj = codec.loads(data)
+            except ValueError:
+                obj = None
+            if not isinstance(obj, dict):
+                handler.error(websocket, "Malformed message")
+                continue
             await handler.handle(websocket, obj)
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
         print("Client disconnected")
+    finally:
+        # whatever ended the loop, the socket's writer task goes with it
+        manager.disconnect(websocket)
 
 
 app.include_router(plans_router)
 app.include_router(auth_router)
 app.include_router(coaches_router)
 app.include_router(conversations_router)
+app.include_router(metrics_router)
 
 if __name__ == "__main__":
     import uvicorn
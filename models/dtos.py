@@ -70,6 +70,7 @@ class WorkoutStepCreate(BaseModel):
     description: Optional[str]
     order: int
     step_id: Optional[int] = None  # For nested steps
+    steps: Optional[List["WorkoutStepCreate"]] = []
 
     class Config:
         from_attributes = True
@@ -125,6 +126,13 @@ class DayRead(DayCreate):
         from_attributes = True
 
 
+# --- Stats ---
+class PlanStats(BaseModel):
+    distance: int = 0
+    time: int = 0
+    reps: int = 0
+
+
 # --- Week ---
 class WeekCreate(BaseModel):
     days: Optional[List[DayCreate]] = []
@@ -136,6 +144,8 @@ class WeekCreate(BaseModel):
 
 class WeekRead(WeekCreate):
     id: int
+    base_week_id: Optional[int] = None
+    stats: Optional[PlanStats] = None
 
     class Config:
         from_attributes = True
@@ -186,6 +196,7 @@ class PlanRead(BaseModel):
     type: PlanType
     coach: CoachRead
     weeks: List[WeekRead] = []
+    stats: Optional[PlanStats] = None
 
     @computed_field
     def weeks_count(self) -> int:
@@ -195,6 +206,14 @@ class PlanRead(BaseModel):
         from_attributes = True
 
 
+class PlanPage(BaseModel):
+    items: List[PlanRead] = []
+    next_cursor: Optional[int] = None
+
+    class Config:
+        from_attributes = True
+
+
 class PlanPreviewRead(BaseModel):
     id: int
     title: str
@@ -206,6 +225,7 @@ class PlanPreviewRead(BaseModel):
     coach: CoachRead
     first_week: Optional[WeekRead] = None
     weeks_count: int
+    stats: Optional[PlanStats] = None
 
     class Config:
         from_attributes = True
@@ -1,6 +1,7 @@
+import uuid
 from datetime import datetime, timezone
 from typing import Optional, List, Dict, Any
-from sqlalchemy import ForeignKey, Enum, DateTime, JSON
+from sqlalchemy import ForeignKey, Enum, DateTime, JSON, Index, func
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, Relationship
 from database import Base
@@ -13,8 +14,8 @@ class AthletePlan(Base):
     __tablename__ = "athlete_plans"
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
-    athlete_id: Mapped[int] = mapped_column(ForeignKey("athletes.id"))
-    plan_id: Mapped[int] = mapped_column(ForeignKey("plans.id"))
+    athlete_id: Mapped[int] = mapped_column(ForeignKey("athletes.id"), index=True)
+    plan_id: Mapped[int] = mapped_column(ForeignKey("plans.id"), index=True)
     started_at: Mapped[datetime] = mapped_column(
         DateTime, default=datetime.now(timezone.utc)
     )
@@ -44,8 +45,8 @@ class Conversation(Base):
     __tablename__ = "conversations"
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
-    recipient_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
+    recipient_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
     created_at: Mapped[datetime] = mapped_column(default=datetime.now())
 
     user = Relationship("User", foreign_keys=[user_id])
@@ -57,6 +58,11 @@ class Conversation(Base):
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        Index(
+            "ix_messages_conversation_id_created_at", "conversation_id", "created_at"
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     conversation_id: Mapped[int] = mapped_column(ForeignKey("conversations.id"))
@@ -72,7 +78,7 @@ class Athlete(Base):
     __tablename__ = "athletes"
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
     description: Mapped[Optional[str]]
 
     user = Relationship("User")
@@ -85,7 +91,7 @@ class Coach(Base):
     __tablename__ = "coaches"
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
     description: Mapped[Optional[str]]
     settings: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSON, default=dict)
 
@@ -96,9 +102,11 @@ class Coach(Base):
 
 class PlanTemplate(Base):
     __tablename__ = "plan_templates"
+    # catalog filters, paginated by id
+    __table_args__ = (Index("ix_plan_templates_level_type_id", "level", "type", "id"),)
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
-    coach_id: Mapped[int] = mapped_column(ForeignKey("coaches.id"))
+    coach_id: Mapped[int] = mapped_column(ForeignKey("coaches.id"), index=True)
     title: Mapped[str]
     description: Mapped[str]
     level: Mapped[PlanLevel] = mapped_column(Enum(PlanLevel, name="level"))
@@ -107,6 +115,12 @@ class PlanTemplate(Base):
     )
     price: Mapped[Optional[float]]
     type: Mapped[PlanType] = mapped_column(Enum(PlanType, name="type"))
+    # bumped on every write to the template tree, backs the ETag
+    version: Mapped[int] = mapped_column(default=1, server_default="1")
+    # maintained by triggers on weeks
+    weeks_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    # totals rolled up from the weeks, see utils/plan_stats.py
+    stats: Mapped[Optional[Dict[str, int]]] = mapped_column(JSONB, nullable=True)
 
     coach = Relationship("Coach", back_populates="plan_templates")
     plans = Relationship("Plan", back_populates="template")
@@ -117,14 +131,16 @@ class Plan(Base):
     __tablename__ = "plans"
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
-    coach_id: Mapped[int] = mapped_column(ForeignKey("coaches.id"))
+    coach_id: Mapped[int] = mapped_column(ForeignKey("coaches.id"), index=True)
     template_id: Mapped[int] = mapped_column(ForeignKey("plan_templates.id"))
     title: Mapped[str]
     description: Mapped[str]
     level: Mapped[PlanLevel] = mapped_column(
-        Enum(PlanLevel, name="plan_level", create_type=False)
+        Enum(PlanLevel, name="level", create_type=False)
     )
     type: Mapped[PlanType] = mapped_column(Enum(PlanType, name="type"))
+    # reads fall back to the template's weeks unless overridden by the plan
+    copy_on_write: Mapped[bool] = mapped_column(default=False, server_default="false")
 
     coach = Relationship("Coach", back_populates="plans")
     weeks = Relationship("Week", back_populates="plan")
@@ -137,6 +153,10 @@ class Plan(Base):
 
 class Week(Base):
     __tablename__ = "weeks"
+    __table_args__ = (
+        Index("ix_weeks_template_id_order", "template_id", "order"),
+        Index("ix_weeks_plan_id_order", "plan_id", "order"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     plan_id: Mapped[int] = mapped_column(ForeignKey("plans.id"), nullable=True)
@@ -144,6 +164,11 @@ class Week(Base):
         ForeignKey("plan_templates.id"), nullable=True
     )
     order: Mapped[int]
+    # template week replaced by this week in a copy-on-write plan
+    base_week_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("weeks.id"), nullable=True
+    )
+    stats: Mapped[Optional[Dict[str, int]]] = mapped_column(JSONB, nullable=True)
 
     plan = Relationship("Plan", back_populates="weeks")
     template = Relationship("PlanTemplate", back_populates="weeks")
@@ -154,7 +179,7 @@ class Day(Base):
     __tablename__ = "days"
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
-    week_id: Mapped[int] = mapped_column(ForeignKey("weeks.id"))
+    week_id: Mapped[int] = mapped_column(ForeignKey("weeks.id"), index=True)
     day_of_week: Mapped[int]
     # maybe redundant? - use day of the week for order
     order: Mapped[int]
@@ -167,7 +192,7 @@ class Workout(Base):
     __tablename__ = "workouts"
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
-    day_id: Mapped[int] = mapped_column(ForeignKey("days.id"))
+    day_id: Mapped[int] = mapped_column(ForeignKey("days.id"), index=True)
     title: Mapped[str]
     description: Mapped[Optional[str]]
     order: Mapped[int]
@@ -179,6 +204,14 @@ class Workout(Base):
 
 class WorkoutStep(Base):
     __tablename__ = "workout_steps"
+    __table_args__ = (
+        Index(
+            "ix_workout_steps_workout_id_path",
+            "workout_id",
+            "path",
+            postgresql_ops={"path": "text_pattern_ops"},
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     workout_id: Mapped[int] = mapped_column(ForeignKey("workouts.id"))
@@ -189,8 +222,11 @@ class WorkoutStep(Base):
     type: Mapped[WorkoutStepType] = mapped_column(
         Enum(WorkoutStepType, name="workout_step_type")
     )
-    step_id = mapped_column(ForeignKey("workout_steps.id"), nullable=True)
+    step_id = mapped_column(ForeignKey("workout_steps.id"), nullable=True, index=True)
     repetitions: Mapped[Optional[int]] = mapped_column(nullable=True, default=1)
+    # sibling positions from the root down, e.g. "0002.0001"; a subtree is
+    # every step of the workout whose path starts with "<path>."
+    path: Mapped[str]
 
     parent: Mapped[Optional["WorkoutStep"]] = Relationship(
         "WorkoutStep",
@@ -202,3 +238,28 @@ class WorkoutStep(Base):
         "WorkoutStep", back_populates="parent", cascade="all, delete-orphan"
     )
     workout = Relationship("Workout", back_populates="steps")
+
+
+class OutboxEvent(Base):
+    __tablename__ = "outbox_events"
+    # the dispatcher only ever looks at pending events
+    __table_args__ = (
+        Index(
+            "ix_outbox_events_pending",
+            "available_at",
+            postgresql_where="processed_at IS NULL",
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    topic: Mapped[str]
+    payload: Mapped[Dict[str, Any]] = mapped_column(JSONB)
+    created_at: Mapped[datetime] = mapped_column(server_default=func.now())
+    # retries are pushed back by moving this forward, so are claimed events
+    # until their lease runs out
+    available_at: Mapped[datetime] = mapped_column(server_default=func.now())
+    # set by every claim, only the holder of the latest lease may finish it
+    lease_token: Mapped[Optional[uuid.UUID]]
+    attempts: Mapped[int] = mapped_column(default=0, server_default="0")
+    last_error: Mapped[Optional[str]]
+    processed_at: Mapped[Optional[datetime]]
@@ -1,48 +1,57 @@
-from fastapi import APIRouter, Depends, Request
-from sqlalchemy.orm import Session, selectinload
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import get_db
+from database import get_db, get_read_db
 from dto import ErrorDTO
 from models.index import Coach
 from models.dtos import CoachUpdateData
 from utils.middleware import require_user_id, require_coach
+from utils.pagination import paginate
+from utils.cache import catalog_cache
+from utils.etag import bump_template_versions
 
 router = APIRouter(prefix="/coaches")
 
 
 @router.get("/")
-def get_coaches(db: Session = Depends(get_db)):
-    coaches = db.query(Coach).options(selectinload(Coach.plans)).all()
+async def get_coaches(
+    cursor: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db),
+):
+    statement = select(Coach).options(selectinload(Coach.plans))
 
-    return coaches
+    coaches, next_cursor = await paginate(db, statement, Coach.id, cursor, limit)
+
+    return {"items": coaches, "next_cursor": next_cursor}
 
 
 @router.get("/auth")
-def get_coaches(
-    db: Session = Depends(get_db),
+async def get_coaches(
+    db: AsyncSession = Depends(get_db),
     user_id: int = Depends(require_user_id),
     is_coach: bool = Depends(require_coach),
 ):
 
-    coaches = (
-        db.query(Coach)
-        .options(selectinload(Coach.plans))
-        .where(Coach.user_id == user_id)
-        .first()
+    coaches = await db.scalar(
+        select(Coach).options(selectinload(Coach.plans)).where(Coach.user_id == user_id)
     )
 
     return coaches
 
 
 @router.put("/auth")
-def update_coach(
+async def update_coach(
     data: CoachUpdateData,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user_id: int = Depends(require_user_id),
     is_coach: bool = Depends(require_coach),
 ):
 
-    coach = db.query(Coach).where(Coach.user_id == user_id).first()
+    coach = await db.scalar(select(Coach).where(Coach.user_id == user_id))
 
     if not coach:
         return ErrorDTO(message="Coach not found", status_code=404)
@@ -51,6 +60,10 @@ def update_coach(
         setattr(coach, key, value)
         db.add(coach)
 
-    db.commit()
+    # coach details are embedded in every template payload: bump the ETag
+    # versions and drop the cached responses
+    await bump_template_versions(db, coach.id)
+    await db.commit()
+    catalog_cache.invalidate("catalog", f"coach:{coach.id}")
 
     return coach
@@ -1,9 +1,10 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy import or_
+from sqlalchemy import or_, select
 from typing import List
-from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.orm import selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import get_db
+from database import get_db, get_read_db
 from utils.middleware import require_user_id
 from models.index import Conversation
 from models.dtos import ConversationRead
@@ -13,32 +14,39 @@ router = APIRouter(prefix="/conversations")
 
 
 @router.get("/", response_model=List[ConversationRead])
-def get_conversations(
-    db: Session = Depends(get_db), user_id: int = Depends(require_user_id)
+async def get_conversations(
+    db: AsyncSession = Depends(get_read_db), user_id: int = Depends(require_user_id)
 ):
     conversations = (
-        db.query(Conversation)
-        .options(selectinload(Conversation.user), selectinload(Conversation.recipient))
-        .filter(
-            or_(Conversation.user_id == user_id, Conversation.recipient_id == user_id)
+        await db.scalars(
+            select(Conversation)
+            .options(
+                selectinload(Conversation.user),
+                selectinload(Conversation.recipient),
+                selectinload(Conversation.messages),
+            )
+            .where(
+                or_(
+                    Conversation.user_id == user_id,
+                    Conversation.recipient_id == user_id,
+                )
+            )
         )
-        .all()
-    )
+    ).all()
 
     return conversations
 
 
 @router.get("/{id}", response_model=ConversationRead)
-def get_conversation(id: int, db: Session = Depends(get_db)):
-    conversation = (
-        db.query(Conversation)
+async def get_conversation(id: int, db: AsyncSession = Depends(get_db)):
+    conversation = await db.scalar(
+        select(Conversation)
         .options(
             selectinload(Conversation.user),
             selectinload(Conversation.recipient),
             selectinload(Conversation.messages),
         )
         .where((Conversation.id == id))
-        .first()
     )
 
     if not conversation:
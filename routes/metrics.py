@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends
+
+from database import async_engine, replicas
+from utils.cache import catalog_cache
+from utils.passwords import passwords
+from utils.jwt import token_cache
+from utils.middleware import require_internal
+from utils.websocket.manager import manager
+from utils.websocket.write_buffer import message_buffer
+
+# pool stats name the database hosts, keep these to internal networks
+router = APIRouter(prefix="/metrics", dependencies=[Depends(require_internal)])
+
+
+@router.get("/cache")
+def get_cache_metrics():
+    return {"catalog": catalog_cache.stats(), "verified_tokens": token_cache.stats()}
+
+
+@router.get("/pool")
+def get_pool_metrics():
+    return {"database": async_engine.pool.stats(), "replicas": replicas.stats()}
+
+
+@router.get("/passwords")
+def get_password_metrics():
+    return {"bcrypt": passwords.stats()}
+
+
+@router.get("/websockets")
+def get_websocket_metrics():
+    return {"websockets": manager.stats(), "message_writes": message_buffer.stats()}
@@ -1,29 +1,46 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session, selectinload
-from sqlalchemy import func, event, Connection, text
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Response, Query, Request
+from sqlalchemy.orm import Session, selectinload, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, event, Connection, text, or_, select
+from sqlalchemy.dialects.postgresql import JSONB
 from datetime import datetime
 
-from database import get_db
+from database import get_db, get_read_db
 from models.index import (
     Plan,
     PlanTemplate,
     AthletePlan,
     Week,
-    Workout,
-    WorkoutStep,
     Day,
     Coach,
     Athlete,
+    Conversation,
 )
+from models.enums import PlanLevel, PlanType
 from models.dtos import (
     PlanCreate,
     PlanUpdate,
     PlanRead,
     PlanPreviewRead,
+    PlanPage,
     CoachRead,
+    WeekRead,
 )
-from utils.middleware import require_user_id
+from utils.middleware import require_user_id, require_coach
+from utils.plan_writer import insert_weeks
+from utils.plan_clone import fork_week
+from utils.plan_tree import (
+    load_template_tree,
+    load_week_tree,
+    load_week_steps,
+    fetch_template_json,
+)
+from utils.pagination import paginate
+from utils.cache import catalog_cache
+from utils.etag import template_etag, etag_matches, not_modified
+from utils.plan_stats import refresh_week_stats
+from utils.outbox import outbox, add_event
 from dto import ErrorDTO
 
 router = APIRouter(prefix="/plans")
@@ -39,83 +56,136 @@ def generate_plan(
     plan_dict = data.model_dump(exclude=fields_to_exclude)
     plan_dict["level"] = plan_dict["level"].value
     plan_dict["type"] = plan_dict["type"].value
-    plan_dict["template_id"] = None if is_template else data.id
+    if not is_template:
+        plan_dict["template_id"] = data.id
     plan = model_class(**plan_dict, coach_id=coach_id)
     db.add(plan)
     db.flush()  # Ensure plan.id is available
 
-    for week_data in getattr(data, "weeks", []):
-        week = Week(
-            template_id=(plan.id if model_class == PlanTemplate else None),
-            plan_id=plan.id if model_class == Plan else None,
-            **week_data.model_dump(exclude={"days"})
-        )
-        db.add(week)
-        db.flush()
-
-        for day_data in getattr(week_data, "days", []):
-            day = Day(week_id=week.id, **day_data.model_dump(exclude={"workouts"}))
-            db.add(day)
-            db.flush()
-
-            for workout_data in getattr(day_data, "workouts", []):
-                workout = Workout(
-                    **workout_data.model_dump(exclude={"steps"}), day_id=day.id
-                )
-                db.add(workout)
-                db.flush()
-
-                for step_data in getattr(workout_data, "steps", []):
-                    workout_step = WorkoutStep(
-                        **step_data.model_dump(), workout_id=workout.id
-                    )
-                    db.add(workout_step)
+    week_ids = insert_weeks(
+        db,
+        data.weeks or [],
+        plan_id=plan.id if model_class == Plan else None,
+        template_id=plan.id if model_class == PlanTemplate else None,
+    )
+    refresh_week_stats(db, week_ids, template_ids=[plan.id] if is_template else [])
 
     db.commit()
     db.refresh(plan)
     return plan
 
 
-@router.get("/", response_model=List[PlanRead])
-def get_plans(db: Session = Depends(get_db)):
-    return (
-        db.query(PlanTemplate)
-        .options(selectinload(PlanTemplate.coach).selectinload(Coach.user))
-        .all()
+@router.get("/", response_model=PlanPage)
+async def get_plans(
+    cursor: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    level: Optional[PlanLevel] = None,
+    type: Optional[PlanType] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    cache_key = f"plans:{cursor}:{limit}:{level}:{type}:{min_price}:{max_price}"
+    cached = catalog_cache.get(cache_key)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+    generation = catalog_cache.generation()
+
+    # everything PlanRead touches is loaded up front, nothing may lazy load
+    statement = select(PlanTemplate).options(
+        selectinload(PlanTemplate.coach).selectinload(Coach.user),
+        selectinload(PlanTemplate.weeks)
+        .selectinload(Week.days)
+        .selectinload(Day.workouts),
     )
 
+    if level:
+        statement = statement.where(PlanTemplate.level == level)
+    if type:
+        statement = statement.where(PlanTemplate.type == type)
+    if min_price is not None:
+        statement = statement.where(PlanTemplate.price >= min_price)
+    if max_price is not None:
+        statement = statement.where(PlanTemplate.price <= max_price)
+
+    plans, next_cursor = await paginate(db, statement, PlanTemplate.id, cursor, limit)
+    await db.run_sync(load_week_steps, [week for plan in plans for week in plan.weeks])
+
+    body = PlanPage.model_validate(
+        {"items": plans, "next_cursor": next_cursor}
+    ).model_dump_json()
+    catalog_cache.set(cache_key, body.encode(), tags=["catalog"], generation=generation)
+
+    return Response(content=body, media_type="application/json")
+
 
 # coach generating a plan template
 @router.post("/", response_model=PlanRead)
-def create_plan(
+async def create_plan(
     data: PlanCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user_id=Depends(require_user_id),
 ):
-    coach = db.query(Coach).filter(Coach.user_id == user_id).first()
+    coach = await db.scalar(select(Coach).where(Coach.user_id == user_id))
     if not coach:
         raise HTTPException(
             400, detail=ErrorDTO(code=400, message="You are not a coach").model_dump()
         )
 
-    plan = generate_plan(db, data, coach.id, model_class=PlanTemplate)
-    return plan
+    plan = await db.run_sync(generate_plan, data, coach.id, PlanTemplate)
+    catalog_cache.invalidate("catalog")
 
+    return await db.run_sync(load_template_tree, plan.id)
 
-@router.get("/{id}", response_model=PlanPreviewRead)
-def get_plan_preview(id: int, db: Session = Depends(get_db)):
-    # fetch plan
-    plan = db.query(PlanTemplate).get(id)
 
-    # count weeks separately
-    weeks_count = db.query(func.count(Week.id)).filter(Week.template_id == id).scalar()
+async def get_template_etag(db: AsyncSession, id: int) -> str:
+    # primary key lookup only, so conditional requests never touch the tree
+    version = await db.scalar(select(PlanTemplate.version).where(PlanTemplate.id == id))
 
-    # fetch first week
-    first_week = (
-        db.query(Week).filter(Week.template_id == id).order_by(Week.order.asc()).first()
+    if version is None:
+        raise HTTPException(
+            404, detail=ErrorDTO(code=404, message="Plan not found").model_dump()
+        )
+
+    return template_etag(id, version)
+
+
+@router.get("/{id}", response_model=PlanPreviewRead)
+async def get_plan_preview(
+    id: int, request: Request, db: AsyncSession = Depends(get_db)
+):
+    etag = await get_template_etag(db, id)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    # keyed by the tag, so a body cached before an update (here or in another
+    # worker) is never served under the new tag
+    cache_key = f"plan:{id}:{etag}"
+    cached = catalog_cache.get(cache_key)
+    if cached is not None:
+        return Response(
+            content=cached, media_type="application/json", headers={"ETag": etag}
+        )
+    generation = catalog_cache.generation()
+
+    # template, coach, user and the first week's tree in a single statement;
+    # the week document is built by the week_json database function
+    first_week_id = (
+        select(Week.id)
+        .where(Week.template_id == PlanTemplate.id)
+        .order_by(Week.order.asc())
+        .limit(1)
+        .correlate(PlanTemplate)
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        select(PlanTemplate, func.week_json(first_week_id, type_=JSONB))
+        .options(joinedload(PlanTemplate.coach).joinedload(Coach.user))
+        .where(PlanTemplate.id == id)
     )
+    plan, first_week = result.one()
 
-    return PlanPreviewRead.model_validate(
+    body = PlanPreviewRead.model_validate(
         {
             "id": plan.id,
             "title": plan.title,
@@ -126,19 +196,40 @@ def get_plan_preview(id: int, db: Session = Depends(get_db)):
             "features": plan.features,
             "coach": CoachRead.model_validate(plan.coach),
             "first_week": first_week,
-            "weeks_count": weeks_count,
+            "weeks_count": plan.weeks_count,
+            "stats": plan.stats,
         }
+    ).model_dump_json()
+    catalog_cache.set(
+        cache_key,
+        body.encode(),
+        tags=[f"plan:{id}", f"coach:{plan.coach_id}"],
+        generation=generation,
     )
 
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+
+@router.get("/{id}/full")
+async def get_plan_full(id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    etag = await get_template_etag(db, id)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    body = await db.run_sync(fetch_template_json, id)
+
+    # serialized by the database, only the coach goes through CoachRead
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
 
 @router.put("/{id}", response_model=PlanRead)
-def update_plan(
+async def update_plan(
     id: int,
     plan: PlanUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user_id=Depends(require_user_id),
 ):
-    plan_in_db = db.query(PlanTemplate).filter(PlanTemplate.id == id).first()
+    plan_in_db = await db.scalar(select(PlanTemplate).where(PlanTemplate.id == id))
 
     if not plan_in_db:
         raise HTTPException(
@@ -148,36 +239,44 @@ def update_plan(
     update_data = plan.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(plan_in_db, key, value)
-    db.commit()
-    db.refresh(plan_in_db)
+    plan_in_db.version = PlanTemplate.version + 1
+    await db.commit()
+    catalog_cache.invalidate("catalog", f"plan:{id}")
 
-    return plan_in_db
+    return await db.run_sync(load_template_tree, id)
 
 
 @router.post("/{plan_template_id}/order")
-def assign_plan_to_athlete(
+async def assign_plan_to_athlete(
     plan_template_id: int,
     user_id: int = Depends(require_user_id),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     # fetch original plan
-    plan_template = (
-        db.query(PlanTemplate).where(PlanTemplate.id == plan_template_id).first()
+    plan_template = await db.scalar(
+        select(PlanTemplate).where(PlanTemplate.id == plan_template_id)
     )
     if not plan_template:
         raise HTTPException(404, "Plan not found")
 
-    athlete = db.query(Athlete).where(Athlete.user_id == user_id).first()
+    athlete = await db.scalar(select(Athlete).where(Athlete.user_id == user_id))
 
     if not athlete:
         raise HTTPException(400, "You are not an athlete")
 
-    new_plan = generate_plan(
-        db,
-        PlanCreate.model_validate(plan_template),
-        plan_template.coach_id,
-        model_class=Plan,
+    # the plan reads through to the template; weeks are only copied when the
+    # coach customizes them (see customize_plan_week)
+    new_plan = Plan(
+        coach_id=plan_template.coach_id,
+        template_id=plan_template.id,
+        title=plan_template.title,
+        description=plan_template.description,
+        level=plan_template.level,
+        type=plan_template.type,
+        copy_on_write=True,
     )
+    db.add(new_plan)
+    await db.flush()
 
     athlete_plan = AthletePlan(
         athlete_id=athlete.id,
@@ -186,13 +285,68 @@ def assign_plan_to_athlete(
     )
 
     db.add(athlete_plan)
-    db.commit()
-    db.refresh(athlete_plan)
+    await db.commit()
+    outbox.wake()
+
     return {"message": "Plan ordered successfully"}
 
 
+# coach customizing a week of an athlete's plan
+@router.post("/athlete/{plan_id}/weeks/{week_id}/customize", response_model=WeekRead)
+async def customize_plan_week(
+    plan_id: int,
+    week_id: int,
+    db: AsyncSession = Depends(get_db),
+    user_id: int = Depends(require_user_id),
+    is_coach: bool = Depends(require_coach),
+):
+    plan = await db.scalar(
+        select(Plan)
+        .join(Coach, Plan.coach_id == Coach.id)
+        .where(Plan.id == plan_id, Coach.user_id == user_id)
+    )
+
+    if not plan:
+        raise HTTPException(
+            404, detail=ErrorDTO(code=404, message="Plan not found").model_dump()
+        )
+
+    week = await db.scalar(
+        select(Week).where(
+            Week.id == week_id,
+            or_(Week.plan_id == plan.id, Week.template_id == plan.template_id),
+        )
+    )
+
+    if not week or (week.plan_id is None and not plan.copy_on_write):
+        raise HTTPException(
+            404, detail=ErrorDTO(code=404, message="Week not found").model_dump()
+        )
+
+    # already owned by the plan, nothing to copy
+    if week.plan_id == plan.id:
+        override_id = week.id
+    else:
+        override_id = await db.scalar(
+            select(Week.id).where(Week.plan_id == plan.id, Week.base_week_id == week.id)
+        )
+
+    if not override_id:
+        override_id = await db.run_sync(fork_week, plan.id, week.id)
+        await db.commit()
+
+    return await db.run_sync(load_week_tree, override_id)
+
+
 @event.listens_for(AthletePlan, "after_insert")
 def receive_after_insert(mapper, connection: Connection, target):
+    # only queued here, the welcome message is sent by the outbox dispatcher
+    # once the order has committed
+    add_event(connection, "athlete_plan.created", {"athlete_plan_id": target.id})
+
+
+@outbox.register("athlete_plan.created")
+async def send_welcome_message(db: AsyncSession, payload: dict):
     sql = text(
         """
         SELECT
@@ -226,14 +380,20 @@ def receive_after_insert(mapper, connection: Connection, target):
         """
     )
 
-    ap = connection.execute(sql, {"id": target.id})
+    ap = await db.execute(sql, {"id": payload["athlete_plan_id"]})
 
     row = ap.first()
+    if not row:
+        return
     dict = row._asdict()
 
     settings = dict["settings"]
 
-    if settings and settings["send_welcome_message"] and settings["welcome_message"]:
+    if (
+        settings
+        and settings.get("send_welcome_message")
+        and settings.get("welcome_message")
+    ):
         athlete_user_id = dict["athlete_user_id"]
         athlete_name = dict["athlete_name"]
         athlete_username = dict["athlete_username"]
@@ -243,7 +403,18 @@ def receive_after_insert(mapper, connection: Connection, target):
             "{athlete_name}", athlete_name if athlete_name else athlete_username
         )
 
-        conversation_insert_result = connection.execute(
+        # an event can be delivered more than once, the coach only greets
+        # each athlete once
+        existing = await db.scalar(
+            select(Conversation.id).where(
+                Conversation.user_id == coach_user_id,
+                Conversation.recipient_id == athlete_user_id,
+            )
+        )
+        if existing:
+            return
+
+        conversation_insert_result = await db.execute(
             text(
                 """
                     INSERT INTO conversations (user_id, recipient_id, created_at) VALUES (:user_id, :recipient_id, :created_at) RETURNING id
@@ -258,7 +429,7 @@ def receive_after_insert(mapper, connection: Connection, target):
 
         conversation_id = conversation_insert_result.scalar_one()
 
-        connection.execute(
+        await db.execute(
             text(
                 """
                 INSERT INTO messages (conversation_id, sender_id, content, created_at)
@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import (
     APIRouter,
     Depends,
@@ -7,15 +8,16 @@ from fastapi import (
     UploadFile,
     Request,
 )
-from sqlalchemy.orm import Session, selectinload
-from bcrypt import hashpw, gensalt, checkpw
-from database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, get_read_db
 from botocore.exceptions import NoCredentialsError
 from uuid import uuid4
 from datetime import datetime
+from typing import Optional
 
 from utils.s3 import s3_client, BUCKET_NAME
-from models.index import User, Coach, Athlete, AthletePlan, Plan
+from models.index import User, Coach, Athlete
 from models.dtos import (
     UserCreate,
     LoginData,
@@ -28,19 +30,41 @@ from models.dtos import (
     VerifyEmailData,
 )
 from dto import ErrorDTO
-from utils.email import send_email, send_mail_to
+from utils.cache import catalog_cache
+from utils.email import send_mail_to
+from utils.etag import bump_template_versions
+from utils.email_queue import email_queue
 from utils.jwt import create_access_token, create_refresh_token, decode_token
 from utils.middleware import require_user_id
+from utils.passwords import passwords
+from utils.plan_clone import load_athlete_plans
 
 COACH_FIELDS = ["description", "settings"]
 
 router = APIRouter(prefix="/auth")
 
 
+async def touch_coach_templates(db: AsyncSession, user_id: int) -> Optional[int]:
+    """Bump the template versions of the coach ``user_id`` is, if any.
+
+    Name, username and avatar are embedded in the coach's template payloads.
+    Returns the coach id, its cached payloads are dropped after the commit.
+    """
+    coach_id = await db.scalar(select(Coach.id).where(Coach.user_id == user_id))
+    if coach_id:
+        await bump_template_versions(db, coach_id)
+    return coach_id
+
+
+def invalidate_coach_payloads(coach_id: Optional[int]):
+    if coach_id:
+        catalog_cache.invalidate("catalog", f"coach:{coach_id}")
+
+
 @router.post("/register")
-def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
 
-    existing_user = db.query(User).filter(User.email == user.email).first()
+    existing_user = await db.scalar(select(User).where(User.email == user.email))
 
     if existing_user:
         raise HTTPException(
@@ -50,33 +74,15 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
 
     user_data = user.model_dump()
     is_coach = user_data.pop("is_coach", False)
-    password = hashpw(user.password.encode("utf-8"), gensalt())
-    user_data["password"] = password.decode("utf-8")
+    user_data["password"] = await passwords.hash(user.password)
     user_data["roles"] = ["coach"] if is_coach else ["athlete"]
     new_user = User(**user_data)
 
     db.add(new_user)
-    db.flush()
+    await db.flush()
 
     new_user.verify_token = create_access_token(new_user, purpose="email_verification")
 
-    try:
-        html = """
-        <p>Hi {},</p>
-        <p>Thank you for registering. Please verify your email by clicking the link below:</p>
-        <a href="http://localhost:3000/verify-email?token={}">Verify Email</a>
-        <p>This link will expire in 15 minutes.</p>
-        <p>If you did not register, please ignore this email.</p>
-        """.format(
-            new_user.name or new_user.email, new_user.verify_token
-        )
-        print(new_user.email)
-        send_email(
-            to=send_mail_to(new_user.email), subject="Verification email", html=html
-        )
-    except Exception as e:
-        print(e)
-
     if is_coach:
         coach = Coach(user_id=new_user.id)
         db.add(coach)
@@ -84,18 +90,31 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
         athlete = Athlete(user_id=new_user.id)
         db.add(athlete)
 
-    db.commit()
-    db.refresh(new_user)
+    html = """
+    <p>Hi {},</p>
+    <p>Thank you for registering. Please verify your email by clicking the link below:</p>
+    <a href="http://localhost:3000/verify-email?token={}">Verify Email</a>
+    <p>This link will expire in 15 minutes.</p>
+    <p>If you did not register, please ignore this email.</p>
+    """.format(
+        new_user.name or new_user.email, new_user.verify_token
+    )
+    # sent in the background, signup doesn't wait on the email provider
+    await email_queue.enqueue(
+        db, to=send_mail_to(new_user.email), subject="Verification email", html=html
+    )
+
+    await db.commit()
 
     return new_user
 
 
 # ---- REFRESH TOKEN ENDPOINT ----
 @router.post("/refresh")
-def refresh_token_endpoint(
+async def refresh_token_endpoint(
     request: Request,
     response: Response,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     refresh_token = request.cookies.get("refresh_token")
     if not refresh_token:
@@ -104,8 +123,8 @@ def refresh_token_endpoint(
         )
     try:
         payload = decode_token(refresh_token)
-        user_id = payload["sub"]
-        user = db.query(User).filter(User.id == user_id).first()
+        user_id = int(payload["sub"])
+        user = await db.scalar(select(User).where(User.id == user_id))
         if not user:
             raise HTTPException(
                 404, detail=ErrorDTO(code=404, message="User not found").model_dump()
@@ -130,23 +149,34 @@ def refresh_token_endpoint(
 
 
 @router.post("/login", response_model=UserRead)
-def login(data: LoginData, response: Response, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == data.email).first()
+async def login(
+    data: LoginData, response: Response, db: AsyncSession = Depends(get_db)
+):
+    user = await db.scalar(select(User).where(User.email == data.email))
 
     if not user:
         raise HTTPException(
             401, detail=ErrorDTO(code=401, message="Invalid credentials").model_dump()
         )
 
-    password_match = checkpw(
-        data.password.encode("utf-8"), user.password.encode("utf-8")
-    )
+    password_match = await passwords.verify(data.password, user.password)
 
     if not password_match:
         raise HTTPException(
             401, detail=ErrorDTO(code=401, message="Invalid credentials").model_dump()
         )
 
+    # upgrade hashes made with an older work factor while we have the password
+    if passwords.needs_rehash(user.password):
+        # best-effort: with the hasher saturated, keep the old hash this time
+        try:
+            user.password = await passwords.hash(data.password)
+        except HTTPException as e:
+            if e.status_code != 503:
+                raise
+        else:
+            await db.commit()
+
     token = create_access_token(user)
     refresh_token = create_refresh_token(user.id)
 
@@ -181,42 +211,35 @@ def logout(response: Response):
 
 
 @router.get("/me", response_model=CurrentUserRead)
-def get_current_user(
+async def get_current_user(
     response: Response,
     user_id=Depends(require_user_id),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
     if not user:
         response.delete_cookie("access_token")
         raise HTTPException(
             401, detail=ErrorDTO(code=401, message="Unauthorized").model_dump()
         )
 
-    athlete = db.query(Athlete).filter(Athlete.user_id == user.id).first()
+    athlete = await db.scalar(select(Athlete).where(Athlete.user_id == user.id))
 
     plans = []
     if athlete:
-        athlete_plans = (
-            db.query(AthletePlan)
-            .filter(AthletePlan.athlete_id == athlete.id)
-            .options(selectinload(AthletePlan.plan).selectinload(Plan.weeks))
-            .all()
-        )
-        plans = athlete_plans
+        plans = await db.run_sync(load_athlete_plans, athlete.id)
 
     return {**user.__dict__, "plans": plans}
 
 
 @router.put("/me")
-def update_current_user(
+async def update_current_user(
     data: UpdateData,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user_id: int = Depends(require_user_id),
 ):
 
-    user = db.query(User).where(User.id == user_id).first()
-    coach = db.query(Coach).where(Coach.user_id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
 
     if not user:
         raise HTTPException(
@@ -227,7 +250,9 @@ def update_current_user(
         setattr(user, key, value)
         db.add(user)
 
-    db.commit()
+    coach_id = await touch_coach_templates(db, user_id)
+    await db.commit()
+    invalidate_coach_payloads(coach_id)
     return {"message": "User updated successfully"}
 
 
@@ -235,11 +260,11 @@ def update_current_user(
 async def upload_file(
     file: UploadFile | None = File(None),
     user_id: int = Depends(require_user_id),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
         # Generate unique filename
-        user = db.query(User).where(User.id == user_id).first()
+        user = await db.scalar(select(User).where(User.id == user_id))
         if not user:
             raise HTTPException(
                 404, detail=ErrorDTO(code=404, message="User not found").model_dump()
@@ -250,17 +275,22 @@ async def upload_file(
             file_key = f"users/{uuid4()}_{file.filename}"
 
             # Upload to S3
-            s3_client.upload_fileobj(file.file, BUCKET_NAME, file_key)
+            await asyncio.to_thread(
+                s3_client.upload_fileobj, file.file, BUCKET_NAME, file_key
+            )
         else:
             # No file → remove avatar
             if user.avatar:
-                s3_client.delete_object(Bucket=BUCKET_NAME, Key=user.avatar)
+                await asyncio.to_thread(
+                    s3_client.delete_object, Bucket=BUCKET_NAME, Key=user.avatar
+                )
             user.avatar = None
 
         user.avatar = file_key
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        coach_id = await touch_coach_templates(db, user_id)
+        await db.commit()
+        invalidate_coach_payloads(coach_id)
 
         return {"avatar": file_key}
 
@@ -272,10 +302,10 @@ async def upload_file(
 
 
 @router.post("/forgot-password")
-def initiate_forgot_password_process(
-    data: ForgotPasswordData, db: Session = Depends(get_db)
+async def initiate_forgot_password_process(
+    data: ForgotPasswordData, db: AsyncSession = Depends(get_db)
 ):
-    user = db.query(User).filter(User.email == data.email).first()
+    user = await db.scalar(select(User).where(User.email == data.email))
 
     if not user:
         raise HTTPException(
@@ -286,7 +316,6 @@ def initiate_forgot_password_process(
 
     user.password_reset_token = token
     db.add(user)
-    db.commit()
 
     # todo: update this
     reset_link = f"http://localhost:3000/reset-password?token={token}"
@@ -299,21 +328,22 @@ def initiate_forgot_password_process(
     <p>If you did not request this, please ignore this email.</p>
     """
 
-    response = send_email(
-        to=user.email, subject="Password Reset Request", html=email_html
+    await email_queue.enqueue(
+        db, to=user.email, subject="Password Reset Request", html=email_html
     )
+    await db.commit()
 
     return {"message": "Password reset email sent"}
 
 
 @router.post("/reset-password")
-def reset_password(data: ResetPasswordData, db: Session = Depends(get_db)):
+async def reset_password(data: ResetPasswordData, db: AsyncSession = Depends(get_db)):
     if "token" in data.model_dump():
         try:
             decoded = decode_token(data.token)
-            user_id = decoded["sub"]
+            user_id = int(decoded["sub"])
 
-            user = db.query(User).filter(User.id == user_id).first()
+            user = await db.scalar(select(User).where(User.id == user_id))
 
             if user.password_reset_token != data.token:
                 raise HTTPException(
@@ -327,15 +357,17 @@ def reset_password(data: ResetPasswordData, db: Session = Depends(get_db)):
                     detail=ErrorDTO(code=404, message="User not found").model_dump(),
                 )
 
-            password = hashpw(data.password.encode("utf-8"), gensalt())
-            user.password = password.decode("utf-8")
+            user.password = await passwords.hash(data.password)
             user.password_reset_token = None
             db.add(user)
-            db.commit()
+            await db.commit()
 
             return {"message": "Your password has been reset"}
 
         except HTTPException as e:
+            # hashing is overloaded, the token is fine
+            if e.status_code == 503:
+                raise
             raise HTTPException(
                 status_code=401, detail="Your password token is invalid or has expired"
             )
@@ -344,17 +376,15 @@ def reset_password(data: ResetPasswordData, db: Session = Depends(get_db)):
 
 
 @router.put("/update-password")
-def update_password(
+async def update_password(
     data: UpdatePasswordData,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user_id: int = Depends(require_user_id),
 ):
 
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
 
-    password_match = checkpw(
-        data.old_password.encode("utf-8"), user.password.encode("utf-8")
-    )
+    password_match = await passwords.verify(data.old_password, user.password)
 
     if not password_match:
         raise HTTPException(
@@ -364,18 +394,17 @@ def update_password(
             ).model_dump(),
         )
 
-    password = hashpw(data.password.encode("utf-8"), gensalt())
-    user.password = password.decode("utf-8")
+    user.password = await passwords.hash(data.password)
     db.add(user)
-    db.commit()
+    await db.commit()
 
     return {"message": "Your password has been updated"}
 
 
 @router.post("/verify-email")
-def verify_email(data: VerifyEmailData, db: Session = Depends(get_db)):
+async def verify_email(data: VerifyEmailData, db: AsyncSession = Depends(get_db)):
 
-    user = db.query(User).where(User.verify_token == data.token).first()
+    user = await db.scalar(select(User).where(User.verify_token == data.token))
 
     if not user:
         raise HTTPException(
@@ -389,6 +418,6 @@ def verify_email(data: VerifyEmailData, db: Session = Depends(get_db)):
     user.verify_token = None
 
     db.add(user)
-    db.commit()
+    await db.commit()
 
     return {"message": "Email successfully verified"}
@@ -0,0 +1,98 @@
+"""The plan documents built by the database functions.
+
+Writes a small template inside a transaction that is rolled back at the
+end. Skipped when no database is configured or reachable.
+"""
+
+import json
+import os
+import pytest
+from dotenv import load_dotenv
+
+load_dotenv()
+if not os.environ.get("DATABASE_URL"):
+    pytest.skip("DATABASE_URL is not set", allow_module_level=True)
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from database import engine
+from utils.plan_stats import refresh_week_stats
+from utils.plan_tree import fetch_template_json
+
+SEED_SQL = """
+WITH u AS (
+    INSERT INTO users (username, email, password)
+    VALUES ('plan-json', 'plan-json@example.com', 'x')
+    RETURNING id
+),
+c AS (
+    INSERT INTO coaches (user_id, settings) SELECT id, '{}' FROM u RETURNING id
+),
+pt AS (
+    INSERT INTO plan_templates (coach_id, title, description, level, type, price, features)
+    SELECT id, 'plan json', 'plan json', 'BEGINNER', 'RUN', 0, '[]' FROM c
+    RETURNING id
+),
+w AS (
+    INSERT INTO weeks (template_id, "order") SELECT id, 1 FROM pt RETURNING id
+),
+d AS (
+    INSERT INTO days (week_id, day_of_week, "order") SELECT id, 1, 1 FROM w
+    RETURNING id
+),
+wo AS (
+    INSERT INTO workouts (day_id, title, "order", type)
+    SELECT id, 'intervals', 1, 'RUN' FROM d
+    RETURNING id
+),
+reps AS (
+    INSERT INTO workout_steps (workout_id, name, "order", value, type, repetitions, path)
+    SELECT id, 'set', 1, 0, 'REPS', 3, '0001' FROM wo
+    RETURNING id, workout_id
+),
+fast AS (
+    INSERT INTO workout_steps
+        (workout_id, name, "order", value, type, repetitions, path, step_id)
+    SELECT workout_id, 'fast', 1, 400, 'DISTANCE', 1, '0001.0001', id FROM reps
+)
+SELECT pt.id, w.id FROM pt, w
+"""
+
+
+@pytest.fixture
+def template():
+    """``(db, template_id, week_id)`` of a one-week template with fresh stats."""
+    try:
+        db = Session(engine)
+        db.execute(text("SELECT 1"))
+    except OperationalError as e:
+        pytest.skip(f"Postgres at DATABASE_URL is not reachable: {e}")
+
+    template_id, week_id = db.execute(text(SEED_SQL)).one()
+    refresh_week_stats(db, [week_id])
+
+    yield db, template_id, week_id
+
+    db.rollback()
+    db.close()
+
+
+def test_week_json_includes_stats(template):
+    db, _, week_id = template
+
+    week = db.execute(text("SELECT week_json(:id)"), {"id": week_id}).scalar()
+
+    assert week["stats"] == {"distance": 1200, "time": 0, "reps": 0}
+
+
+def test_template_json_weeks_include_stats(template):
+    db, template_id, _ = template
+
+    document = json.loads(fetch_template_json(db, template_id))
+
+    assert [week["stats"] for week in document["weeks"]] == [
+        {"distance": 1200, "time": 0, "reps": 0}
+    ]
+    assert document["coach"]["user"]["username"] == "plan-json"
@@ -0,0 +1,298 @@
+"""EXPLAIN the hot queries of the API against a seeded Postgres.
+
+Seeds synthetic rows inside a transaction, runs ``EXPLAIN`` on every query
+in ``HOT_QUERIES`` and fails when one of them scans a large table
+sequentially. Everything is rolled back at the end, but point DATABASE_URL
+at a local database: the planner statistics of the seeded tables are
+refreshed. Skipped when no database is configured or reachable.
+
+    QUERY_PLAN_SCALE=1 QUERY_PLAN_MIN_ROWS=1000 python -m pytest tests
+"""
+
+import json
+import os
+from typing import Callable, Dict, Iterator, List, Tuple
+import pytest
+from dotenv import load_dotenv
+
+load_dotenv()
+if not os.environ.get("DATABASE_URL"):
+    pytest.skip("DATABASE_URL is not set", allow_module_level=True)
+
+from sqlalchemy import Select, or_, select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from database import engine
+from models.enums import PlanLevel, PlanType
+from models.index import (
+    Athlete,
+    AthletePlan,
+    Coach,
+    Conversation,
+    Day,
+    Message,
+    PlanTemplate,
+    Week,
+    Workout,
+    WorkoutStep,
+)
+
+SCALE = int(os.environ.get("QUERY_PLAN_SCALE", 1))
+# tables with at least this many rows must not be scanned
+MIN_ROWS = int(os.environ.get("QUERY_PLAN_MIN_ROWS", 1000))
+
+SEED_SQL = """
+INSERT INTO users (username, email, password)
+SELECT 'seed' || g, 'seed-' || g || '@example.com', 'x'
+FROM generate_series(1, 2000 * :scale) g;
+
+INSERT INTO coaches (user_id)
+SELECT id FROM users WHERE email LIKE 'seed-%' AND id % 2 = 0;
+
+INSERT INTO athletes (user_id)
+SELECT id FROM users WHERE email LIKE 'seed-%' AND id % 2 = 1;
+
+INSERT INTO plan_templates (coach_id, title, description, level, type, price, features)
+SELECT
+    c.id,
+    'seed',
+    'seed',
+    (ARRAY['BEGINNER', 'INTERMEDIATE', 'ADVANCED'])[1 + g % 3]::level,
+    (ARRAY['RUN', 'STRENGTH', 'HYBRID'])[1 + g % 3]::type,
+    g % 100,
+    '[]'
+FROM coaches c
+JOIN users u ON u.id = c.user_id AND u.email LIKE 'seed-%'
+CROSS JOIN generate_series(1, 2) g;
+
+INSERT INTO plans (coach_id, template_id, title, description, level, type)
+SELECT coach_id, id, title, description, level, type
+FROM plan_templates
+WHERE title = 'seed';
+
+INSERT INTO weeks (template_id, "order")
+SELECT pt.id, g
+FROM plan_templates pt
+CROSS JOIN generate_series(1, 4) g
+WHERE pt.title = 'seed';
+
+INSERT INTO weeks (plan_id, "order")
+SELECT p.id, 1
+FROM plans p
+WHERE p.title = 'seed';
+
+INSERT INTO athlete_plans (athlete_id, plan_id, started_at)
+SELECT a.id, p.id, now()
+FROM (
+    SELECT id, row_number() OVER (ORDER BY id) AS n FROM plans WHERE title = 'seed'
+) p
+JOIN (
+    SELECT id, row_number() OVER (ORDER BY id) AS n FROM athletes
+) a ON a.n = 1 + p.n % (SELECT count(*) FROM athletes);
+
+INSERT INTO days (week_id, day_of_week, "order")
+SELECT w.id, g, g
+FROM weeks w
+JOIN plan_templates pt ON pt.id = w.template_id AND pt.title = 'seed'
+CROSS JOIN generate_series(1, 3) g;
+
+INSERT INTO workouts (day_id, title, "order", type)
+SELECT d.id, 'seed', 1, 'RUN'
+FROM days d
+JOIN weeks w ON w.id = d.week_id
+JOIN plan_templates pt ON pt.id = w.template_id AND pt.title = 'seed';
+
+INSERT INTO workout_steps (workout_id, path, name, "order", value, type, repetitions)
+SELECT w.id, lpad(g::text, 4, '0'), 'seed', g, 400, 'DISTANCE', 1
+FROM workouts w
+CROSS JOIN generate_series(1, 3) g
+WHERE w.title = 'seed';
+
+INSERT INTO workout_steps (
+    workout_id, step_id, path, name, "order", value, type, repetitions
+)
+SELECT s.workout_id, s.id, s.path || '.' || lpad(g::text, 4, '0'), 'seed', g, 60,
+    'TIME', 1
+FROM workout_steps s
+CROSS JOIN generate_series(1, 2) g
+WHERE s.name = 'seed' AND s.step_id IS NULL;
+
+INSERT INTO conversations (user_id, recipient_id, created_at)
+SELECT c.user_id, a.user_id, now()
+FROM (SELECT user_id, row_number() OVER (ORDER BY id) AS n FROM coaches) c
+JOIN (SELECT user_id, row_number() OVER (ORDER BY id) AS n FROM athletes) a
+    ON a.n = c.n;
+
+INSERT INTO messages (conversation_id, sender_id, content, created_at)
+SELECT c.id, c.user_id, 'seed', now() - g * interval '1 minute'
+FROM conversations c
+CROSS JOIN generate_series(1, 20) g;
+"""
+
+TABLES = [
+    "users",
+    "coaches",
+    "athletes",
+    "plan_templates",
+    "plans",
+    "weeks",
+    "days",
+    "workouts",
+    "workout_steps",
+    "athlete_plans",
+    "conversations",
+    "messages",
+]
+
+
+def sample_ids(db: Session) -> Dict[str, List[int]]:
+    def ids(sql: str) -> List[int]:
+        return list(db.execute(text(sql)).scalars())
+
+    return {
+        "user": ids("SELECT user_id FROM conversations ORDER BY id DESC LIMIT 1"),
+        "coach": ids("SELECT id FROM coaches ORDER BY id DESC LIMIT 1"),
+        "athlete": ids("SELECT athlete_id FROM athlete_plans ORDER BY id DESC LIMIT 1"),
+        "conversation": ids("SELECT id FROM conversations ORDER BY id DESC LIMIT 20"),
+        "template": ids("SELECT id FROM plan_templates ORDER BY id DESC LIMIT 20"),
+        "plan": ids("SELECT id FROM plans ORDER BY id DESC LIMIT 20"),
+        "week": ids("SELECT id FROM weeks ORDER BY id DESC LIMIT 20"),
+        "day": ids("SELECT id FROM days ORDER BY id DESC LIMIT 20"),
+        "workout": ids("SELECT id FROM workouts ORDER BY id DESC LIMIT 20"),
+        "step": ids("SELECT id FROM workout_steps ORDER BY id DESC LIMIT 1"),
+    }
+
+
+# (name, statement built from the sample ids): what routes/ and utils/ issue
+# on every hot read
+HOT_QUERIES: List[Tuple[str, Callable[[Dict[str, List[int]]], Select]]] = [
+    ("coach by user", lambda ids: select(Coach).where(Coach.user_id == ids["user"][0])),
+    (
+        "athlete by user",
+        lambda ids: select(Athlete).where(Athlete.user_id == ids["user"][0]),
+    ),
+    (
+        "catalog page",
+        lambda ids: select(PlanTemplate)
+        .where(
+            PlanTemplate.level == PlanLevel.BEGINNER,
+            PlanTemplate.type == PlanType.RUN,
+            PlanTemplate.id > 0,
+        )
+        .order_by(PlanTemplate.id)
+        .limit(21),
+    ),
+    (
+        "coach templates",
+        lambda ids: select(PlanTemplate).where(
+            PlanTemplate.coach_id == ids["coach"][0]
+        ),
+    ),
+    (
+        "template weeks",
+        lambda ids: select(Week).where(Week.template_id.in_(ids["template"])),
+    ),
+    (
+        "preview first week",
+        lambda ids: select(Week.id)
+        .where(Week.template_id == ids["template"][0])
+        .order_by(Week.order.asc())
+        .limit(1),
+    ),
+    ("plan weeks", lambda ids: select(Week).where(Week.plan_id.in_(ids["plan"]))),
+    ("week days", lambda ids: select(Day).where(Day.week_id.in_(ids["week"]))),
+    (
+        "day workouts",
+        lambda ids: select(Workout).where(Workout.day_id.in_(ids["day"])),
+    ),
+    (
+        "workout steps",
+        lambda ids: select(WorkoutStep)
+        .where(WorkoutStep.workout_id.in_(ids["workout"]))
+        .order_by(WorkoutStep.workout_id, WorkoutStep.path),
+    ),
+    (
+        "step children",
+        lambda ids: select(WorkoutStep).where(WorkoutStep.step_id == ids["step"][0]),
+    ),
+    (
+        "athlete plans",
+        lambda ids: select(AthletePlan).where(
+            AthletePlan.athlete_id == ids["athlete"][0]
+        ),
+    ),
+    (
+        "user conversations",
+        lambda ids: select(Conversation).where(
+            or_(
+                Conversation.user_id == ids["user"][0],
+                Conversation.recipient_id == ids["user"][0],
+            )
+        ),
+    ),
+    (
+        "conversation messages",
+        lambda ids: select(Message)
+        .where(Message.conversation_id.in_(ids["conversation"]))
+        .order_by(Message.created_at.asc()),
+    ),
+]
+
+
+def plan_nodes(node: dict) -> Iterator[dict]:
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+@pytest.fixture(scope="module")
+def seeded():
+    """The seeded session, the tables large enough to matter and sample ids."""
+    try:
+        db = Session(engine)
+        db.execute(text("SELECT 1"))
+    except OperationalError as e:
+        pytest.skip(f"Postgres at DATABASE_URL is not reachable: {e}")
+
+    for statement in SEED_SQL.split(";"):
+        if statement.strip():
+            db.execute(text(statement), {"scale": SCALE})
+    for table in TABLES:
+        db.execute(text(f"ANALYZE {table}"))
+
+    rows = dict(
+        db.execute(
+            text("SELECT relname, reltuples FROM pg_class WHERE relname = ANY(:t)"),
+            {"t": TABLES},
+        ).all()
+    )
+    large = {table for table, count in rows.items() if count >= MIN_ROWS}
+
+    yield db, large, sample_ids(db)
+
+    db.rollback()
+    db.close()
+
+
+@pytest.mark.parametrize(
+    "name, build", HOT_QUERIES, ids=[name for name, _ in HOT_QUERIES]
+)
+def test_hot_query_uses_indexes(seeded, name, build):
+    db, large, ids = seeded
+    sql = str(
+        build(ids).compile(
+            dialect=engine.dialect, compile_kwargs={"literal_binds": True}
+        )
+    )
+
+    explained = db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+    if isinstance(explained, str):
+        explained = json.loads(explained)
+
+    scans = [
+        node["Relation Name"]
+        for node in plan_nodes(explained[0]["Plan"])
+        if node["Node Type"] == "Seq Scan" and node["Relation Name"] in large
+    ]
+    assert not scans, f"{name}: sequential scan on {', '.join(scans)}\n{sql}"
@@ -0,0 +1,137 @@
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Iterable, Optional, Set
+
+
+class ResponseCache:
+    """In-process LRU cache of serialized responses.
+
+    Entries expire after ``ttl`` seconds and the least recently used ones
+    are evicted once ``max_entries`` or ``max_bytes`` is exceeded. Every
+    entry carries tags so writes can drop everything they affect.
+
+    A fill started before an invalidation of one of its tags would put the
+    old value back, so fills pass the ``generation()`` read before they
+    queried and are dropped when one of their tags was invalidated since.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self._entries: "OrderedDict[str, tuple[float, bytes, Set[str]]]" = (
+            OrderedDict()
+        )
+        self._tags: Dict[str, Set[str]] = {}
+        self._size = 0
+        # tag -> generation of its last invalidation; fills older than
+        # _floor are dropped once the map is cleared to bound it
+        self._generation = 0
+        self._invalidated: Dict[str, int] = {}
+        self._floor = 0
+        self._lock = Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale_fills = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def generation(self) -> int:
+        """Read before querying the data of a fill, see ``set``."""
+        with self._lock:
+            return self._generation
+
+    def set(
+        self,
+        key: str,
+        value: bytes,
+        tags: Iterable[str] = (),
+        generation: Optional[int] = None,
+    ):
+        if len(value) > self.max_bytes:
+            return
+
+        with self._lock:
+            tags = set(tags)
+            if generation is not None and (
+                generation < self._floor
+                or any(self._invalidated.get(tag, 0) > generation for tag in tags)
+            ):
+                self.stale_fills += 1
+                return
+
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (time.monotonic() + self.ttl, value, tags)
+            self._size += len(value)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, *tags: str):
+        with self._lock:
+            self._generation += 1
+            if len(self._invalidated) >= self.max_entries:
+                self._invalidated.clear()
+                self._floor = self._generation
+            for tag in tags:
+                self._invalidated[tag] = self._generation
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "stale_fills": self.stale_fills,
+            }
+
+    def _remove(self, key: str):
+        _, value, tags = self._entries.pop(key)
+        self._size -= len(value)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+# presigned avatar urls in the payloads expire after an hour and ETags
+# change every half hour (utils/etag.py), keep ttl well below that
+catalog_cache = ResponseCache(
+    max_entries=int(os.environ.get("CATALOG_CACHE_MAX_ENTRIES", 1024)),
+    max_bytes=int(os.environ.get("CATALOG_CACHE_MAX_BYTES", 32 * 1024 * 1024)),
+    ttl=float(os.environ.get("CATALOG_CACHE_TTL", 60)),
+)
@@ -1,23 +1,46 @@
 import os
 import resend
 
-resend.api_key = os.environ["RESEND_API_KEY"]
+resend.api_key = os.environ.get("RESEND_API_KEY")
 
 
-def send_email(to: str, subject: str, html: str):
-    params: resend.Emails.SendParams = {
-        "to": [to],
-        "from": "Coachapp <onboarding@resend.dev>",
-        "html": html,
-        "subject": subject,
-    }
-    email = resend.Emails.send(params)
+class ResendTransport:
+    def send(self, to: str, subject: str, html: str):
+        params: resend.Emails.SendParams = {
+            "to": [to],
+            "from": "Coachapp <onboarding@resend.dev>",
+            "html": html,
+            "subject": subject,
+        }
+        return resend.Emails.send(params)
+
+
+class FakeTransport:
+    """Keeps emails in memory instead of sending them, for local runs and tests."""
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, to: str, subject: str, html: str):
+        email = {"to": to, "subject": subject, "html": html}
+        self.sent.append(email)
+        return email
 
-    return email
+
+transport = (
+    FakeTransport()
+    if os.environ.get("EMAIL_TRANSPORT") == "fake"
+    else ResendTransport()
+)
+
+
+def send_email(to: str, subject: str, html: str):
+    # blocking, request handlers go through utils/email_queue.py
+    return transport.send(to, subject, html)
 
 
 def send_mail_to(email_address: str) -> str:
-    if os.environ("ENV") == "production":
+    if os.environ.get("ENV") == "production":
         return email_address
 
-    return os.environ("RESEND_DEV_EMAIL")
+    return os.environ.get("RESEND_DEV_EMAIL")
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import os
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.index import OutboxEvent
+from utils.email import send_email
+from utils.outbox import outbox
+
+logger = logging.getLogger("app.email")
+
+
+class AsyncioEmailQueue:
+    """In-process queue drained by ``concurrency`` worker tasks.
+
+    Emails only enter the queue once the session they were queued on commits.
+    A failed send is put back after an exponential backoff, up to
+    ``max_attempts`` tries. Queued emails are lost if the process exits.
+    """
+
+    def __init__(self, concurrency: int, max_attempts: int, max_backoff: float):
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.max_backoff = max_backoff
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._workers = []
+
+    async def enqueue(self, db: AsyncSession, to: str, subject: str, html: str):
+        # held on the session until its transaction commits, so a token that
+        # was rolled back is never mailed
+        pending = db.info.get("emails")
+        if pending is None:
+            pending = db.info["emails"] = []
+            event.listen(db.sync_session, "after_commit", self._release)
+            event.listen(db.sync_session, "after_rollback", self._discard)
+        pending.append({"to": to, "subject": subject, "html": html})
+
+    def _release(self, session):
+        for email in session.info["emails"]:
+            self._queue.put_nowait((email, 1))
+        session.info["emails"].clear()
+
+    def _discard(self, session):
+        session.info["emails"].clear()
+
+    async def start(self):
+        self._workers = [
+            asyncio.create_task(self._work()) for _ in range(self.concurrency)
+        ]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+
+    async def _work(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            email, attempt = await self._queue.get()
+            try:
+                # the transports block, keep them off the event loop
+                await asyncio.to_thread(send_email, **email)
+            except Exception as e:
+                if attempt < self.max_attempts:
+                    logger.warning(
+                        "Sending email to %s failed (%s): %r", email["to"], attempt, e
+                    )
+                    loop.call_later(
+                        min(2**attempt, self.max_backoff),
+                        self._queue.put_nowait,
+                        (email, attempt + 1),
+                    )
+                else:
+                    logger.exception(
+                        "Sending email to %s failed (%s), giving up",
+                        email["to"],
+                        attempt,
+                    )
+            finally:
+                self._queue.task_done()
+
+
+class OutboxEmailQueue:
+    """Emails stored as outbox events, for deployments with several workers.
+
+    The email is committed with the request's transaction and sent by
+    whichever worker's dispatcher claims it; retries follow the outbox.
+    """
+
+    async def enqueue(self, db: AsyncSession, to: str, subject: str, html: str):
+        db.add(
+            OutboxEvent(
+                topic="email.send", payload={"to": to, "subject": subject, "html": html}
+            )
+        )
+        # dispatch as soon as the request's transaction commits
+        event.listen(
+            db.sync_session, "after_commit", lambda _: outbox.wake(), once=True
+        )
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+# sent outside the dispatcher's transactions, no lock is held on the way
+@outbox.register("email.send", transactional=False)
+async def deliver_email(payload: dict):
+    await asyncio.to_thread(send_email, **payload)
+
+
+if os.environ.get("EMAIL_QUEUE_BACKEND") == "postgres":
+    email_queue = OutboxEmailQueue()
+else:
+    email_queue = AsyncioEmailQueue(
+        concurrency=int(os.environ.get("EMAIL_CONCURRENCY", 4)),
+        max_attempts=int(os.environ.get("EMAIL_MAX_ATTEMPTS", 5)),
+        max_backoff=float(os.environ.get("EMAIL_MAX_BACKOFF", 60)),
+    )
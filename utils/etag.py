@@ -0,0 +1,46 @@
+import time
+from fastapi import Request, Response
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.index import PlanTemplate
+from utils.images import PRESIGNED_URL_EXPIRES
+
+# the payloads embed presigned avatar urls; a tag only matches bodies made
+# in the same half of the url lifetime, whose urls are still valid
+PRESIGN_WINDOW = PRESIGNED_URL_EXPIRES // 2
+
+
+def template_etag(template_id: int, version: int) -> str:
+    window = int(time.time() // PRESIGN_WINDOW)
+    return f'"plan-{template_id}-{version}-{window}"'
+
+
+async def bump_template_versions(db: AsyncSession, coach_id: int):
+    """Change the ETag of every template of a coach, in the caller's transaction.
+
+    Coach and user details are embedded in every template payload.
+    """
+    await db.execute(
+        update(PlanTemplate)
+        .where(PlanTemplate.coach_id == coach_id)
+        .values(version=PlanTemplate.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+
+    if header.strip() == "*":
+        return True
+
+    # If-None-Match uses the weak comparison
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
@@ -1,7 +1,9 @@
 from .s3 import s3_client, BUCKET_NAME
 
+PRESIGNED_URL_EXPIRES = 3600
 
-def get_presigned_url(key: str, expires_in: int = 3600) -> str:
+
+def get_presigned_url(key: str, expires_in: int = PRESIGNED_URL_EXPIRES) -> str:
     return s3_client.generate_presigned_url(
         "get_object", Params={"Bucket": BUCKET_NAME, "Key": key}, ExpiresIn=expires_in
     )
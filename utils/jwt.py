@@ -1,4 +1,8 @@
-from typing import Any
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Optional
 from datetime import datetime, timedelta, timezone
 from fastapi import HTTPException
 import jwt
@@ -49,3 +53,66 @@ def decode_token(token: str) -> dict[str, Any]:
             detail="Invalid token",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+
+class VerifiedTokenCache:
+    """LRU of tokens whose signature has already been checked.
+
+    Keyed by the whole token, signature included, so only a byte-identical
+    token hits. Entries are dropped at the token's ``exp``, an expired token
+    always goes back through ``decode_token``.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, dict[str, Any]]" = OrderedDict()
+        self._lock = Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[dict[str, Any]]:
+        with self._lock:
+            payload = self._entries.get(token)
+            if payload is None or payload["exp"] <= time.time():
+                if payload is not None:
+                    del self._entries[token]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return payload
+
+    def set(self, token: str, payload: dict[str, Any]):
+        if "exp" not in payload:
+            return
+
+        with self._lock:
+            self._entries[token] = payload
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+token_cache = VerifiedTokenCache(
+    max_entries=int(os.environ.get("TOKEN_CACHE_MAX_ENTRIES", 10000))
+)
+
+
+def decode_access_token(token: str) -> dict[str, Any]:
+    """``decode_token`` for cookies sent on every request, cached until ``exp``."""
+    payload = token_cache.get(token)
+    if payload is None:
+        payload = decode_token(token)
+        token_cache.set(token, payload)
+    return payload
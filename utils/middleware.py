@@ -1,26 +1,83 @@
+import ipaddress
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import List, Optional
 from fastapi import HTTPException, Request
 
-from .jwt import decode_token
+from .jwt import decode_access_token
+from .query_stats import QueryStats, current_stats
 
 from dto import ErrorDTO
 
 
+logger = logging.getLogger("app.queries")
+
+# a statement shape repeated this often in one request is reported as N+1
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("QUERY_N_PLUS_ONE_THRESHOLD", 10))
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated caller, decoded once per request by add_user_to_request."""
+
+    user_id: int
+    roles: List[str]
+
+
+def get_principal(request: Request) -> Optional[Principal]:
+    return getattr(request.state, "principal", None)
+
+
 def require_user_id(request: Request):
-    user_id = getattr(request.state, "user_id", None)
-    if not user_id:
+    principal = get_principal(request)
+    if not principal:
         raise HTTPException(
             status_code=401,
             detail=ErrorDTO(code=401, message="Unauthorized").model_dump(),
         )
-    return user_id
+    return principal.user_id
 
 
 def require_coach(request: Request):
-    access_token = request.cookies.get("access_token")
+    principal = get_principal(request)
+    if not principal:
+        raise HTTPException(
+            status_code=401,
+            detail=ErrorDTO(code=401, message="Unauthorized").model_dump(),
+        )
+
+    if "coach" not in principal.roles:
+        raise HTTPException(
+            status_code=403,
+            detail=ErrorDTO(code=403, message="Forbidden").model_dump(),
+        )
+
+    return True
+
 
-    payload = decode_token(access_token)
+# comma separated networks allowed to read /metrics, loopback by default
+METRICS_ALLOWED_NETWORKS = [
+    ipaddress.ip_network(network.strip())
+    for network in os.environ.get(
+        "METRICS_ALLOWED_NETWORKS", "127.0.0.1/32,::1/128"
+    ).split(",")
+    if network.strip()
+]
 
-    if "coach" not in payload["roles"]:
+
+def require_internal(request: Request):
+    """Only let internal callers through, e.g. the metrics scraper."""
+    try:
+        address = ipaddress.ip_address(request.client.host)
+    except (AttributeError, ValueError):
+        address = None
+
+    if address is None or not any(
+        address in network for network in METRICS_ALLOWED_NETWORKS
+    ):
         raise HTTPException(
             status_code=403,
             detail=ErrorDTO(code=403, message="Forbidden").model_dump(),
@@ -29,22 +86,65 @@ def require_coach(request: Request):
     return True
 
 
+def principal_from_token(access_token: Optional[str]) -> Optional[Principal]:
+    if not access_token:
+        return None
+
+    try:
+        payload = decode_access_token(access_token)
+    except HTTPException:
+        return None
+
+    return Principal(user_id=int(payload.get("sub")), roles=payload.get("roles") or [])
+
+
 async def add_user_to_request(request: Request, call_next):
-    access_token = request.cookies.get("access_token")
     # refresh_token = request.cookies.get("refresh_token")
+    principal = principal_from_token(request.cookies.get("access_token"))
 
-    if access_token:
-        try:
-            # Try normal decode
-            payload = decode_token(access_token)
-            request.state.user_id = payload.get("sub")
-            request.state.roles = payload.get("roles")
-        except HTTPException as e:
-            request.state.user_id = None
-    else:
-        request.state.user_id = None
+    request.state.principal = principal
+    request.state.user_id = principal.user_id if principal else None
+    request.state.roles = principal.roles if principal else None
 
     # Call next middleware / endpoint
     response = await call_next(request)
 
     return response
+
+
+async def add_query_stats(request: Request, call_next):
+    stats = QueryStats()
+    token = current_stats.set(stats)
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        current_stats.reset(token)
+
+    duration = (time.perf_counter() - started) * 1000
+    db_duration = stats.duration * 1000
+    response.headers["Server-Timing"] = (
+        f'db;dur={db_duration:.1f};desc="{stats.count} queries", '
+        f"app;dur={duration:.1f}"
+    )
+
+    route = request.scope.get("route")
+    repeated = stats.repeated(N_PLUS_ONE_THRESHOLD)
+    logger.log(
+        logging.WARNING if repeated else logging.INFO,
+        json.dumps(
+            {
+                "method": request.method,
+                "route": route.path if route else request.url.path,
+                "status": response.status_code,
+                "duration_ms": round(duration, 1),
+                "db_queries": stats.count,
+                "db_duration_ms": round(db_duration, 1),
+                "n_plus_one": [
+                    {"statement": shape, "count": count} for shape, count in repeated
+                ],
+            }
+        ),
+    )
+
+    return response
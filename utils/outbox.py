@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import os
+import uuid
+from datetime import timedelta
+from typing import List
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal
+from models.index import OutboxEvent
+
+logger = logging.getLogger("app.outbox")
+
+
+def add_event(connection: Connection, topic: str, payload: dict):
+    """Queue an event in the caller's transaction.
+
+    Takes a plain connection so it can run from inside a flush; the event
+    is only seen by the dispatcher once that transaction commits.
+    """
+    connection.execute(insert(OutboxEvent).values(topic=topic, payload=payload))
+
+
+class OutboxDispatcher:
+    """Hands committed outbox events to the handler registered for their topic.
+
+    A batch is claimed with ``FOR UPDATE SKIP LOCKED``, leased by pushing its
+    ``available_at`` ``lease`` seconds ahead, and the claim commits right
+    away: no lock or connection is held while the handlers run, up to
+    ``concurrency`` at once. Transactional handlers get a session, their
+    writes commit together with the event being marked processed; the others
+    (network calls such as email) run outside any transaction. A failing
+    event is retried with exponential backoff until ``max_attempts``, one
+    whose worker died is picked up again once its lease runs out. Every claim
+    sets a new ``lease_token``, results are only recorded under the latest
+    one, so a handler that outlived its lease can't finish the event twice.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        batch_size: int,
+        poll_interval: float,
+        max_attempts: int,
+        max_backoff: float,
+        lease: float,
+        concurrency: int,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self.concurrency = concurrency
+        # topic -> (handler, transactional)
+        self.handlers = {}
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(concurrency)
+        self._stopping = False
+
+    def register(self, topic: str, transactional: bool = True):
+        """``handler(db, payload)``, or ``handler(payload)`` if not transactional."""
+
+        def decorator(func):
+            self.handlers[topic] = (func, transactional)
+            return func
+
+        return decorator
+
+    def wake(self):
+        """Dispatch now instead of at the next poll, e.g. right after a commit."""
+        self._wakeup.set()
+
+    async def claim_batch(self) -> List[OutboxEvent]:
+        async with self.session_factory() as db:
+            claimable = (
+                select(OutboxEvent.id)
+                .where(
+                    OutboxEvent.processed_at.is_(None),
+                    OutboxEvent.available_at <= func.now(),
+                    OutboxEvent.attempts < self.max_attempts,
+                )
+                .order_by(OutboxEvent.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            events = (
+                await db.scalars(
+                    update(OutboxEvent)
+                    .where(OutboxEvent.id.in_(claimable))
+                    .values(
+                        available_at=func.now() + timedelta(seconds=self.lease),
+                        lease_token=uuid.uuid4(),
+                    )
+                    .returning(OutboxEvent)
+                    .execution_options(synchronize_session=False)
+                )
+            ).all()
+            await db.commit()
+            return sorted(events, key=lambda event: event.id)
+
+    async def dispatch_batch(self) -> int:
+        events = await self.claim_batch()
+        await asyncio.gather(*(self._dispatch(event) for event in events))
+        return len(events)
+
+    async def _dispatch(self, event: OutboxEvent):
+        async with self._slots:
+            handler, transactional = self.handlers.get(event.topic, (None, False))
+            try:
+                if not handler:
+                    raise LookupError(f"No handler for topic: {event.topic}")
+                if transactional:
+                    async with self.session_factory() as db:
+                        await handler(db, event.payload)
+                        await self._mark_processed(db, event)
+                else:
+                    await handler(event.payload)
+                    async with self.session_factory() as db:
+                        await self._mark_processed(db, event)
+            except Exception as e:
+                await self._retry_later(event, e)
+
+    def _leased(self, event: OutboxEvent):
+        # a handler outliving its lease may have been claimed again since
+        return update(OutboxEvent).where(
+            OutboxEvent.id == event.id,
+            OutboxEvent.lease_token == event.lease_token,
+            OutboxEvent.processed_at.is_(None),
+        )
+
+    async def _mark_processed(self, db: AsyncSession, event: OutboxEvent):
+        result = await db.execute(self._leased(event).values(processed_at=func.now()))
+        if result.rowcount == 0:
+            # a transactional handler's writes go away with the lease
+            logger.warning("Outbox event %s lost its lease, not marked", event.id)
+            await db.rollback()
+            return
+        await db.commit()
+
+    async def _retry_later(self, event: OutboxEvent, error: Exception):
+        attempts = event.attempts + 1
+        logger.warning("Outbox event %s failed (%s): %r", event.id, attempts, error)
+        async with self.session_factory() as db:
+            await db.execute(
+                self._leased(event).values(
+                    attempts=attempts,
+                    last_error=repr(error),
+                    # database clock throughout, it also stamped created_at
+                    available_at=func.now()
+                    + timedelta(seconds=min(2**attempts, self.max_backoff)),
+                )
+            )
+            await db.commit()
+
+    def stop(self):
+        """Let ``run`` return once the batch in flight is done."""
+        self._stopping = True
+        self._wakeup.set()
+
+    async def run(self):
+        while not self._stopping:
+            try:
+                # keep draining while batches come back full
+                while (
+                    await self.dispatch_batch() == self.batch_size
+                    and not self._stopping
+                ):
+                    pass
+            except Exception:
+                logger.exception("Outbox dispatch failed")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+
+outbox = OutboxDispatcher(
+    AsyncSessionLocal,
+    batch_size=int(os.environ.get("OUTBOX_BATCH_SIZE", 100)),
+    poll_interval=float(os.environ.get("OUTBOX_POLL_INTERVAL", 2)),
+    max_attempts=int(os.environ.get("OUTBOX_MAX_ATTEMPTS", 10)),
+    max_backoff=float(os.environ.get("OUTBOX_MAX_BACKOFF", 300)),
+    lease=float(os.environ.get("OUTBOX_LEASE", 60)),
+    concurrency=int(os.environ.get("OUTBOX_CONCURRENCY", 10)),
+)
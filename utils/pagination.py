@@ -0,0 +1,23 @@
+from typing import Any, List, Optional, Tuple
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+async def paginate(
+    db: AsyncSession, statement: Select, column, cursor: Optional[Any], limit: int
+) -> Tuple[List[Any], Optional[Any]]:
+    """Keyset pagination on a unique, indexed column.
+
+    Returns the page and the cursor of the next one (``None`` on the last
+    page). Fetches one extra row to know whether there is a next page.
+    """
+    if cursor is not None:
+        statement = statement.where(column > cursor)
+
+    rows = (await db.scalars(statement.order_by(column.asc()).limit(limit + 1))).all()
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, getattr(rows[-1], column.key)
+
+    return rows, None
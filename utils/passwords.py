@@ -0,0 +1,104 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from bcrypt import checkpw, gensalt, hashpw
+from fastapi import HTTPException
+
+from dto import ErrorDTO
+
+
+class PasswordHasher:
+    """bcrypt on a dedicated, bounded thread pool.
+
+    bcrypt releases the GIL, so ``workers`` threads hash in parallel without
+    touching the event loop or the threadpool the rest of the API uses. When
+    ``max_pending`` calls are already queued or running, new ones fail fast
+    with a 503, so a login burst only slows down login.
+    """
+
+    def __init__(self, rounds: int, workers: int, max_pending: int):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="bcrypt"
+        )
+
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.busy_seconds = 0.0
+        self._lock = Lock()
+
+    def _timed(self, func, *args):
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self.busy_seconds += time.perf_counter() - started
+
+    async def _run(self, func, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                503,
+                detail=ErrorDTO(
+                    code=503, message="Too many requests, try again shortly"
+                ).model_dump(),
+                headers={"Retry-After": "1"},
+            )
+
+        self.pending += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._timed, func, *args
+            )
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.pending -= 1
+        self.completed += 1
+        return result
+
+    async def hash(self, password: str) -> str:
+        hashed = await self._run(
+            hashpw, password.encode("utf-8"), gensalt(rounds=self.rounds)
+        )
+        return hashed.decode("utf-8")
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(
+            checkpw, password.encode("utf-8"), hashed.encode("utf-8")
+        )
+
+    def needs_rehash(self, hashed: str) -> bool:
+        # "$2b$12$<salt><hash>", the cost is the second field
+        try:
+            return int(hashed.split("$")[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def stats(self) -> dict:
+        return {
+            "rounds": self.rounds,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "queued": max(self.pending - self.workers, 0),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "busy_seconds": round(self.busy_seconds, 3),
+        }
+
+
+passwords = PasswordHasher(
+    rounds=int(os.environ.get("BCRYPT_ROUNDS", 12)),
+    workers=int(os.environ.get("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1))),
+    max_pending=int(os.environ.get("PASSWORD_HASH_MAX_PENDING", 64)),
+)
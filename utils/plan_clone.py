@@ -0,0 +1,170 @@
+from collections import defaultdict
+from typing import Dict, List
+from sqlalchemy import text, or_
+from sqlalchemy.orm import Session, attributes, selectinload
+
+from models.index import Plan, Week, Day, Coach, AthletePlan
+from utils.plan_tree import load_week_steps
+
+# Copies everything below the weeks listed in ``week_map``.
+#
+# Every *_map CTE pairs the source row id with a freshly reserved id from the
+# table's sequence; the next level joins on the map of its parent to remap
+# the foreign key. CTEs calling nextval() are always materialized, so each
+# map is computed exactly once, and the foreign keys are checked at the end
+# of the statement when all levels are in place. Step paths hold sibling
+# positions rather than ids, so they are copied verbatim.
+_COPY_WEEK_TREE = """
+    day_map AS (
+        SELECT
+            d.id AS old_id,
+            wm.new_id AS week_id,
+            nextval(pg_get_serial_sequence('days', 'id')) AS new_id
+        FROM days d
+        JOIN week_map wm ON wm.old_id = d.week_id
+    ),
+    new_days AS (
+        INSERT INTO days (id, week_id, day_of_week, "order")
+        SELECT dm.new_id, dm.week_id, d.day_of_week, d."order"
+        FROM days d
+        JOIN day_map dm ON dm.old_id = d.id
+    ),
+    workout_map AS (
+        SELECT
+            w.id AS old_id,
+            dm.new_id AS day_id,
+            nextval(pg_get_serial_sequence('workouts', 'id')) AS new_id
+        FROM workouts w
+        JOIN day_map dm ON dm.old_id = w.day_id
+    ),
+    new_workouts AS (
+        INSERT INTO workouts (id, day_id, title, description, "order", type)
+        SELECT wm.new_id, wm.day_id, w.title, w.description, w."order", w.type
+        FROM workouts w
+        JOIN workout_map wm ON wm.old_id = w.id
+    ),
+    step_map AS (
+        SELECT
+            s.id AS old_id,
+            wm.new_id AS workout_id,
+            nextval(pg_get_serial_sequence('workout_steps', 'id')) AS new_id
+        FROM workout_steps s
+        JOIN workout_map wm ON wm.old_id = s.workout_id
+    ),
+    new_steps AS (
+        INSERT INTO workout_steps (
+            id, workout_id, step_id, path, name, description, "order", value, type,
+            repetitions
+        )
+        SELECT
+            sm.new_id,
+            sm.workout_id,
+            parent.new_id,
+            s.path,
+            s.name,
+            s.description,
+            s."order",
+            s.value,
+            s.type,
+            s.repetitions
+        FROM workout_steps s
+        JOIN step_map sm ON sm.old_id = s.id
+        LEFT JOIN step_map parent ON parent.old_id = s.step_id
+    )
+"""
+
+# Copies a single template week into a copy-on-write plan as its override.
+FORK_WEEK_SQL = text(
+    """
+    WITH week_map AS (
+        SELECT w.id AS old_id, nextval(pg_get_serial_sequence('weeks', 'id')) AS new_id
+        FROM weeks w
+        WHERE w.id = :week_id
+    ),
+    new_weeks AS (
+        INSERT INTO weeks (id, plan_id, template_id, base_week_id, "order", stats)
+        SELECT wm.new_id, CAST(:plan_id AS integer), NULL, w.id, w."order", w.stats
+        FROM weeks w
+        JOIN week_map wm ON wm.old_id = w.id
+    ),
+    """
+    + _COPY_WEEK_TREE
+    + """
+    SELECT new_id FROM week_map
+    """
+)
+
+
+def fork_week(db: Session, plan_id: int, week_id: int) -> int:
+    """Copy one template week into a copy-on-write plan so it can be customized.
+
+    Returns the id of the plan's own week, which overrides ``week_id``.
+    """
+    return db.execute(
+        FORK_WEEK_SQL, {"plan_id": plan_id, "week_id": week_id}
+    ).scalar_one()
+
+
+def load_effective_weeks(db: Session, plans: List[Plan]):
+    """Populate ``plan.weeks`` of copy-on-write plans with template + overrides.
+
+    The weeks of every plan and template involved come back in one query and
+    are matched up in Python.
+    """
+    plans = [plan for plan in plans if plan.copy_on_write]
+    if not plans:
+        return
+
+    weeks = (
+        db.query(Week)
+        .filter(
+            or_(
+                Week.plan_id.in_({plan.id for plan in plans}),
+                Week.template_id.in_({plan.template_id for plan in plans}),
+            )
+        )
+        .options(selectinload(Week.days).selectinload(Day.workouts))
+        .order_by(Week.order.asc(), Week.id)
+        .all()
+    )
+
+    own: Dict[int, List[Week]] = defaultdict(list)
+    shared: Dict[int, List[Week]] = defaultdict(list)
+    for week in weeks:
+        if week.plan_id is not None:
+            own[week.plan_id].append(week)
+        else:
+            shared[week.template_id].append(week)
+
+    for plan in plans:
+        overridden = {week.base_week_id for week in own[plan.id]}
+        effective = own[plan.id] + [
+            week for week in shared[plan.template_id] if week.id not in overridden
+        ]
+        effective.sort(key=lambda week: week.order)
+        # committed value: the template weeks must never be re-parented
+        attributes.set_committed_value(plan, "weeks", effective)
+
+
+def load_athlete_plans(db: Session, athlete_id: int) -> List[AthletePlan]:
+    """Load an athlete's plans with their effective weeks down to nested steps."""
+    athlete_plans = (
+        db.query(AthletePlan)
+        .filter(AthletePlan.athlete_id == athlete_id)
+        .options(
+            selectinload(AthletePlan.plan)
+            .selectinload(Plan.coach)
+            .selectinload(Coach.user),
+            selectinload(AthletePlan.plan)
+            .selectinload(Plan.weeks)
+            .selectinload(Week.days)
+            .selectinload(Day.workouts),
+        )
+        .all()
+    )
+
+    plans = [athlete_plan.plan for athlete_plan in athlete_plans]
+    load_effective_weeks(db, plans)
+    load_week_steps(db, [week for plan in plans for week in plan.weeks])
+
+    return athlete_plans
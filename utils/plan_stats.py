@@ -0,0 +1,98 @@
+from typing import Iterable, List
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Totals per week of DISTANCE, TIME and REPS steps. A step counts
+# value * repetitions of itself and of every enclosing step; steps with
+# children only group them and don't count their own value.
+WEEK_STATS_SQL = text(
+    """
+    WITH RECURSIVE tree AS (
+        SELECT s.id, d.week_id, s.type, s.value, coalesce(s.repetitions, 1) AS multiplier
+        FROM workout_steps s
+        JOIN workouts wo ON wo.id = s.workout_id
+        JOIN days d ON d.id = wo.day_id
+        WHERE d.week_id = ANY(:week_ids)
+        AND s.step_id IS NULL
+        UNION ALL
+        SELECT c.id, t.week_id, c.type, c.value, t.multiplier * coalesce(c.repetitions, 1)
+        FROM workout_steps c
+        JOIN tree t ON c.step_id = t.id
+    ),
+    totals AS (
+        SELECT
+            t.week_id,
+            sum(t.value * t.multiplier) FILTER (WHERE t.type = 'DISTANCE') AS distance,
+            sum(t.value * t.multiplier) FILTER (WHERE t.type = 'TIME') AS time,
+            sum(t.value * t.multiplier) FILTER (WHERE t.type = 'REPS') AS reps
+        FROM tree t
+        WHERE NOT EXISTS (SELECT 1 FROM workout_steps c WHERE c.step_id = t.id)
+        GROUP BY t.week_id
+    )
+    UPDATE weeks w
+    SET stats = jsonb_build_object(
+        'distance', coalesce(totals.distance, 0),
+        'time', coalesce(totals.time, 0),
+        'reps', coalesce(totals.reps, 0)
+    )
+    FROM unnest(CAST(:week_ids AS integer[])) AS target(id)
+    LEFT JOIN totals ON totals.week_id = target.id
+    WHERE w.id = target.id
+    """
+)
+
+# Rolls the stored week totals up into their templates, no tree walk.
+TEMPLATE_STATS_SQL = text(
+    """
+    WITH totals AS (
+        SELECT
+            template_id,
+            sum((stats->>'distance')::bigint) AS distance,
+            sum((stats->>'time')::bigint) AS time,
+            sum((stats->>'reps')::bigint) AS reps
+        FROM weeks
+        WHERE template_id = ANY(:template_ids)
+        GROUP BY template_id
+    )
+    UPDATE plan_templates pt
+    SET stats = jsonb_build_object(
+        'distance', coalesce(totals.distance, 0),
+        'time', coalesce(totals.time, 0),
+        'reps', coalesce(totals.reps, 0)
+    )
+    FROM unnest(CAST(:template_ids AS integer[])) AS target(id)
+    LEFT JOIN totals ON totals.template_id = target.id
+    WHERE pt.id = target.id
+    """
+)
+
+
+def refresh_week_stats(
+    db: Session, week_ids: List[int], template_ids: Iterable[int] = ()
+):
+    """Recompute the stats of changed weeks and of the templates they belong to.
+
+    ``template_ids`` are refreshed too, a template without weeks gets zeros.
+    """
+    template_ids = set(template_ids)
+
+    if week_ids:
+        db.execute(WEEK_STATS_SQL, {"week_ids": week_ids})
+        template_ids.update(
+            db.execute(
+                text(
+                    "SELECT DISTINCT template_id FROM weeks "
+                    "WHERE id = ANY(:week_ids) AND template_id IS NOT NULL"
+                ),
+                {"week_ids": week_ids},
+            ).scalars()
+        )
+
+    refresh_template_stats(db, sorted(template_ids))
+
+
+def refresh_template_stats(db: Session, template_ids: List[int]):
+    if not template_ids:
+        return
+
+    db.execute(TEMPLATE_STATS_SQL, {"template_ids": template_ids})
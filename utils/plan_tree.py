@@ -0,0 +1,151 @@
+from typing import Dict, List, Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session, attributes, selectinload
+
+from models.dtos import CoachRead
+from models.index import PlanTemplate, Coach, Week, Day, Workout, WorkoutStep
+
+
+def step_path(parent_path: Optional[str], position: int) -> str:
+    segment = f"{position:04d}"
+    return f"{parent_path}.{segment}" if parent_path else segment
+
+
+def attach_step_trees(workouts: List[Workout], steps: List[WorkoutStep]):
+    """Link flat steps into trees and set them on their workouts.
+
+    ``steps`` must be ordered by path so parents come before their
+    children and siblings keep their position.
+    """
+    roots: Dict[int, List[WorkoutStep]] = {workout.id: [] for workout in workouts}
+    children: Dict[int, List[WorkoutStep]] = {step.id: [] for step in steps}
+
+    for step in steps:
+        if step.step_id is None:
+            roots[step.workout_id].append(step)
+        else:
+            children[step.step_id].append(step)
+
+    # committed values so the relationships don't lazy load or get flushed
+    for step in steps:
+        attributes.set_committed_value(step, "steps", children[step.id])
+    for workout in workouts:
+        attributes.set_committed_value(workout, "steps", roots[workout.id])
+
+
+def load_workout_steps(db: Session, workouts: List[Workout]):
+    """Fetch every step of ``workouts`` in one query and assemble the trees."""
+    if not workouts:
+        return
+
+    steps = (
+        db.query(WorkoutStep)
+        .filter(WorkoutStep.workout_id.in_([workout.id for workout in workouts]))
+        .order_by(WorkoutStep.workout_id, WorkoutStep.path)
+        .all()
+    )
+    attach_step_trees(workouts, steps)
+
+
+def load_week_steps(db: Session, weeks: List[Week]):
+    load_workout_steps(
+        db,
+        [workout for week in weeks for day in week.days for workout in day.workouts],
+    )
+
+
+def load_week_tree(db: Session, week_id: int) -> Optional[Week]:
+    """Load a single week down to nested steps."""
+    week = (
+        db.query(Week)
+        .options(selectinload(Week.days).selectinload(Day.workouts))
+        .filter(Week.id == week_id)
+        .first()
+    )
+    if week:
+        load_week_steps(db, [week])
+    return week
+
+
+def load_template_tree(db: Session, template_id: int) -> Optional[PlanTemplate]:
+    """Load a plan template with its weeks down to nested steps."""
+    plan = (
+        db.query(PlanTemplate)
+        .options(
+            selectinload(PlanTemplate.coach).selectinload(Coach.user),
+            selectinload(PlanTemplate.weeks)
+            .selectinload(Week.days)
+            .selectinload(Day.workouts),
+        )
+        .filter(PlanTemplate.id == template_id)
+        .first()
+    )
+    if plan:
+        load_week_steps(db, plan.weeks)
+    return plan
+
+
+# The whole template document is built by Postgres (see the week_json and
+# workout_steps_json functions) and handed back as text, ready to send. The
+# coach is read first: its avatar url is presigned in Python, then the
+# validated coach is merged into the document by the database.
+TEMPLATE_COACH_SQL = text(
+    """
+    SELECT jsonb_build_object(
+        'id', c.id,
+        'description', c.description,
+        'settings', c.settings,
+        'user', jsonb_build_object(
+            'id', u.id,
+            'username', u.username,
+            'email', u.email,
+            'name', u.name,
+            'avatar', u.avatar,
+            'roles', u.roles
+        )
+    )
+    FROM plan_templates pt
+    JOIN coaches c ON c.id = pt.coach_id
+    JOIN users u ON u.id = c.user_id
+    WHERE pt.id = :template_id
+    """
+)
+
+TEMPLATE_JSON_SQL = text(
+    """
+    SELECT (
+        jsonb_build_object(
+            'id', pt.id,
+            'title', pt.title,
+            'description', pt.description,
+            'level', pt.level::text,
+            'type', pt.type::text,
+            'price', pt.price,
+            'features', pt.features,
+            'weeks', coalesce(
+                (
+                    SELECT jsonb_agg(week_json(w.id) ORDER BY w."order")
+                    FROM weeks w
+                    WHERE w.template_id = pt.id
+                ),
+                '[]'::jsonb
+            )
+        )
+        || jsonb_build_object('coach', CAST(:coach AS jsonb))
+    )::text
+    FROM plan_templates pt
+    WHERE pt.id = :template_id
+    """
+)
+
+
+def fetch_template_json(db: Session, template_id: int) -> Optional[str]:
+    coach = db.execute(TEMPLATE_COACH_SQL, {"template_id": template_id}).scalar()
+    if coach is None:
+        return None
+
+    # the same CoachRead the other plan endpoints return
+    coach = CoachRead.model_validate(coach).model_dump_json()
+    return db.execute(
+        TEMPLATE_JSON_SQL, {"template_id": template_id, "coach": coach}
+    ).scalar()
@@ -0,0 +1,116 @@
+from typing import List, Optional
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from models.index import Week, Day, Workout, WorkoutStep
+from models.dtos import WeekCreate
+from utils.plan_tree import step_path
+
+
+def insert_rows(db: Session, model, rows: List[dict]) -> List[int]:
+    """Insert all rows with one multi-row INSERT ... RETURNING id.
+
+    Ids come back in the same order as ``rows`` so callers can zip them
+    with the source data to link the next level of the tree.
+    """
+    if not rows:
+        return []
+
+    result = db.execute(
+        insert(model).returning(model.id, sort_by_parameter_order=True), rows
+    )
+    return list(result.scalars())
+
+
+def insert_weeks(
+    db: Session,
+    weeks: List[WeekCreate],
+    plan_id: Optional[int] = None,
+    template_id: Optional[int] = None,
+) -> List[int]:
+    # one statement per level: weeks -> days -> workouts -> steps
+    week_ids = insert_rows(
+        db,
+        Week,
+        [
+            {
+                "plan_id": plan_id,
+                "template_id": template_id,
+                **week.model_dump(exclude={"days"}),
+            }
+            for week in weeks
+        ],
+    )
+
+    days = [
+        (week_id, day_data)
+        for week_id, week_data in zip(week_ids, weeks)
+        for day_data in week_data.days or []
+    ]
+    day_ids = insert_rows(
+        db,
+        Day,
+        [
+            {"week_id": week_id, **day_data.model_dump(exclude={"workouts"})}
+            for week_id, day_data in days
+        ],
+    )
+
+    workouts = [
+        (day_id, workout_data)
+        for day_id, (_, day_data) in zip(day_ids, days)
+        for workout_data in day_data.workouts or []
+    ]
+    workout_ids = insert_rows(
+        db,
+        Workout,
+        [
+            {"day_id": day_id, **workout_data.model_dump(exclude={"steps"})}
+            for day_id, workout_data in workouts
+        ],
+    )
+
+    insert_steps(
+        db,
+        [
+            (workout_id, None, None, position, step_data)
+            for workout_id, (_, workout_data) in zip(workout_ids, workouts)
+            for position, step_data in enumerate(workout_data.steps or [], start=1)
+        ],
+    )
+
+    return week_ids
+
+
+def insert_steps(db: Session, steps: List[tuple]):
+    """Insert nested steps one depth at a time.
+
+    ``steps`` holds ``(workout_id, parent_id, parent_path, position, data)``
+    tuples for the roots; each depth costs a single statement.
+    """
+    while steps:
+        paths = [
+            step_path(parent_path, position)
+            for _, _, parent_path, position, _ in steps
+        ]
+        step_ids = insert_rows(
+            db,
+            WorkoutStep,
+            [
+                {
+                    "workout_id": workout_id,
+                    "step_id": parent_id,
+                    "path": path,
+                    **step_data.model_dump(exclude={"steps", "step_id"}),
+                }
+                for (workout_id, parent_id, _, _, step_data), path in zip(steps, paths)
+            ],
+        )
+
+        steps = [
+            (workout_id, step_id, path, position, child_data)
+            for step_id, path, (workout_id, _, _, _, step_data) in zip(
+                step_ids, paths, steps
+            )
+            for position, child_data in enumerate(step_data.steps or [], start=1)
+        ]
@@ -0,0 +1,105 @@
+import os
+import time
+from bisect import bisect_left
+from threading import Lock
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# upper bounds in seconds, the last bucket catches everything slower
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def pool_options() -> dict:
+    """Engine pool arguments from the environment.
+
+    With ``DB_POOL_PRE_PING`` off, dead connections are handled
+    optimistically: the failing statement raises, the pool is invalidated
+    and the next checkout reconnects, instead of paying a round trip on
+    every checkout. ``DB_POOL_RECYCLE`` keeps connections younger than
+    server or proxy idle timeouts either way.
+    """
+    return {
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", 5)),
+        "max_overflow": int(os.environ.get("DB_POOL_MAX_OVERFLOW", 10)),
+        "pool_timeout": float(os.environ.get("DB_POOL_TIMEOUT", 30)),
+        "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": os.environ.get("DB_POOL_PRE_PING", "false").lower()
+        in ("1", "true", "yes"),
+    }
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long checkouts wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = Lock()
+        self.wait_counts = [0] * (len(WAIT_BUCKETS) + 1)
+        self.wait_total = 0.0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+
+    def _create_connection(self):
+        with self._stats_lock:
+            self.connects += 1
+        return super()._create_connection()
+
+    def _invalidate(self, connection, exception=None, _checkin=True):
+        # a disconnect error drops every pooled connection at once
+        with self._stats_lock:
+            self.invalidations += 1
+        return super()._invalidate(connection, exception, _checkin)
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+
+        waited = time.perf_counter() - started
+        with self._stats_lock:
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_counts[bisect_left(WAIT_BUCKETS, waited)] += 1
+        return record
+
+    def recreate(self):
+        # invalidating the whole pool builds a fresh one; carry the counters
+        pool = super().recreate()
+        with self._stats_lock:
+            pool.wait_counts = list(self.wait_counts)
+            pool.wait_total = self.wait_total
+            pool.checkouts = self.checkouts
+            pool.timeouts = self.timeouts
+            pool.connects = self.connects
+            pool.invalidations = self.invalidations
+        return pool
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            histogram = {}
+            cumulative = 0
+            for bound, count in zip(WAIT_BUCKETS, self.wait_counts):
+                cumulative += count
+                histogram[str(bound)] = cumulative
+            histogram["+Inf"] = cumulative + self.wait_counts[-1]
+
+            return {
+                "size": self.size(),
+                "checked_in": self.checkedin(),
+                "checked_out": self.checkedout(),
+                "overflow": max(self.overflow(), 0),
+                "max_overflow": self._max_overflow,
+                "timeout": self._timeout,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "wait_seconds_total": round(self.wait_total, 6),
+                "wait_seconds_bucket": histogram,
+            }
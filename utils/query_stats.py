@@ -0,0 +1,61 @@
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# bound parameter lists of any length collapse to one shape, so
+# "IN ($1, $2)" and "IN ($1, $2, $3)" count as the same statement
+_PARAM = r"(?:\$\d+(?:::\w+)?|%\(\w+\)s|\?)"
+_PARAM_LIST = re.compile(rf"\(\s*{_PARAM}(?:\s*,\s*{_PARAM})*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    return _PARAM_LIST.sub("(?)", _WHITESPACE.sub(" ", statement).strip())
+
+
+class QueryStats:
+    """SQL issued while handling one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes: Counter = Counter()
+
+    def record(self, statement: str, duration: float):
+        self.count += 1
+        self.duration += duration
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Statement shapes run at least ``threshold`` times, likely N+1 loads."""
+        return [
+            (shape, count)
+            for shape, count in self.shapes.most_common()
+            if count >= threshold
+        ]
+
+
+current_stats: ContextVar[Optional[QueryStats]] = ContextVar(
+    "current_stats", default=None
+)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # the context variable follows the request into run_sync greenlets
+    stats = current_stats.get()
+    if stats is not None:
+        stats.record(statement, time.perf_counter() - context._query_started)
+
+
+def instrument(engine: Engine):
+    """Record the statements of ``engine`` into the current request's stats."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
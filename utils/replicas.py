@@ -0,0 +1,52 @@
+import itertools
+import time
+from threading import Lock
+from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+
+class ReplicaSet:
+    """Round-robin over read replicas, skipping the ones that recently failed.
+
+    A replica that can't hand out a connection is benched for ``cooldown``
+    seconds; when every replica is benched, reads go to the primary.
+    """
+
+    def __init__(self, engines: List[AsyncEngine], cooldown: float):
+        self.engines = engines
+        self.cooldown = cooldown
+        self.sessions = [
+            async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+            for engine in engines
+        ]
+
+        self._benched_until = [0.0] * len(engines)
+        self._next = itertools.count()
+        self._lock = Lock()
+
+    def __bool__(self) -> bool:
+        return bool(self.engines)
+
+    def pick(self) -> Optional[int]:
+        now = time.monotonic()
+        with self._lock:
+            for _ in range(len(self.engines)):
+                index = next(self._next) % len(self.engines)
+                if self._benched_until[index] <= now:
+                    return index
+        return None
+
+    def bench(self, index: int):
+        with self._lock:
+            self._benched_until[index] = time.monotonic() + self.cooldown
+
+    def stats(self) -> List[dict]:
+        now = time.monotonic()
+        return [
+            {
+                "url": engine.url.render_as_string(hide_password=True),
+                "healthy": benched_until <= now,
+                "pool": engine.pool.stats(),
+            }
+            for engine, benched_until in zip(self.engines, self._benched_until)
+        ]
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import os
+import uuid
+from collections import OrderedDict
+from typing import Callable, Hashable, Iterable, List, Optional
+import asyncpg
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+
+from database import ASYNC_DATABASE_URL, async_engine
+from utils.websocket import codec
+
+logger = logging.getLogger("app.websocket")
+
+# called with (user_ids, frame, coalesce_key) for events of other nodes
+Deliver = Callable[[Iterable[int], str, Optional[Hashable]], None]
+
+
+class InMemoryBackplane:
+    """Single process: every socket is local, nothing to forward."""
+
+    async def start(self, deliver: Deliver):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(
+        self, user_ids: Iterable[int], frame: str, coalesce_key: Optional[Hashable]
+    ):
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": "memory"}
+
+
+class PostgresBackplane:
+    """Forwards events to the other nodes over Postgres ``LISTEN/NOTIFY``.
+
+    The publishing node has already delivered to its own sockets, so every
+    node skips its own notifications and delivers the rest to its local
+    sockets only. A notification carries at most 8000 bytes; larger frames
+    are split into chunks sent in one transaction, which Postgres delivers
+    together and in order. Events published while the listener reconnects
+    are lost, clients refetch the conversation when they reconnect.
+    """
+
+    CHUNK_CHARS = 1900  # 4 bytes per character at worst, stays below 8000
+
+    def __init__(self, engine, dsn: str, channel: str, reconnect_interval: float):
+        self.engine = engine
+        self.dsn = dsn
+        self.channel = channel
+        self.reconnect_interval = reconnect_interval
+        self.node_id = uuid.uuid4().hex[:12]
+
+        self._deliver: Optional[Deliver] = None
+        self._listener: Optional[asyncio.Task] = None
+        # chunk id -> pieces received so far
+        self._chunks: "OrderedDict[str, List[str]]" = OrderedDict()
+
+        self.published = 0
+        self.received = 0
+        self.chunked = 0
+        self.failed = 0
+        self.reconnects = 0
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+
+    async def publish(
+        self, user_ids: Iterable[int], frame: str, coalesce_key: Optional[Hashable]
+    ):
+        payload = codec.dumps(
+            {
+                "node": self.node_id,
+                "users": list(user_ids),
+                "key": coalesce_key,
+                "frame": frame,
+            }
+        )
+        if len(payload.encode("utf-8")) < 8000:
+            payloads = [payload]
+        else:
+            self.chunked += 1
+            chunk_id = uuid.uuid4().hex
+            pieces = [
+                payload[i : i + self.CHUNK_CHARS]
+                for i in range(0, len(payload), self.CHUNK_CHARS)
+            ]
+            # numbered, Postgres folds identical notifications of a transaction
+            payloads = [
+                f"chunk:{chunk_id}:{len(pieces)}:{seq}:{piece}"
+                for seq, piece in enumerate(pieces)
+            ]
+
+        try:
+            async with self.engine.begin() as connection:
+                for payload in payloads:
+                    await connection.execute(
+                        text("SELECT pg_notify(:channel, :payload)"),
+                        {"channel": self.channel, "payload": payload},
+                    )
+        except Exception:
+            # the event is already stored and delivered locally
+            self.failed += 1
+            logger.exception("WebSocket backplane publish failed")
+            return
+        self.published += 1
+
+    def _on_notification(self, connection, pid, channel, payload: str):
+        if payload.startswith("chunk:"):
+            _, chunk_id, total, _, piece = payload.split(":", 4)
+            pieces = self._chunks.setdefault(chunk_id, [])
+            pieces.append(piece)
+            if len(pieces) < int(total):
+                # incomplete frames of a dropped connection, don't keep them all
+                while len(self._chunks) > 100:
+                    self._chunks.popitem(last=False)
+                return
+            payload = "".join(self._chunks.pop(chunk_id))
+
+        event = codec.loads(payload)
+        if event["node"] == self.node_id:
+            return
+        self.received += 1
+        key = event["key"]
+        self._deliver(
+            event["users"], event["frame"], tuple(key) if isinstance(key, list) else key
+        )
+
+    async def _listen(self):
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                await connection.add_listener(self.channel, self._on_notification)
+                while not connection.is_closed():
+                    await asyncio.sleep(self.reconnect_interval)
+                    # a round trip notices a dead connection
+                    await connection.execute("SELECT 1")
+            except asyncio.CancelledError:
+                if connection is not None:
+                    await connection.close()
+                raise
+            except Exception:
+                logger.exception("WebSocket backplane listener failed")
+                if connection is not None:
+                    # don't wait on a dead socket for a graceful close
+                    connection.terminate()
+
+            self.reconnects += 1
+            await asyncio.sleep(self.reconnect_interval)
+
+    def stats(self) -> dict:
+        return {
+            "backend": "postgres",
+            "node": self.node_id,
+            "channel": self.channel,
+            "published": self.published,
+            "received": self.received,
+            "chunked": self.chunked,
+            "failed": self.failed,
+            "reconnects": self.reconnects,
+        }
+
+
+def create_backplane():
+    backend = os.environ.get("WS_BACKPLANE", "memory")
+    if backend == "postgres":
+        return PostgresBackplane(
+            async_engine,
+            # asyncpg takes a plain postgresql:// DSN
+            make_url(ASYNC_DATABASE_URL)
+            .set(drivername="postgresql")
+            .render_as_string(hide_password=False),
+            channel=os.environ.get("WS_BACKPLANE_CHANNEL", "websocket_events"),
+            reconnect_interval=float(
+                os.environ.get("WS_BACKPLANE_RECONNECT_INTERVAL", 5)
+            ),
+        )
+    return InMemoryBackplane()
@@ -0,0 +1,23 @@
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+# frames are text, orjson hands back bytes
+if orjson is not None:
+
+    def dumps(message: Any) -> str:
+        return orjson.dumps(message).decode("utf-8")
+
+    loads = orjson.loads
+
+else:
+
+    def dumps(message: Any) -> str:
+        return json.dumps(message, separators=(",", ":"))
+
+    loads = json.loads
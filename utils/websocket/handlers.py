@@ -1,53 +1,105 @@
-from sqlalchemy.orm import Session
+from typing import FrozenSet, Optional
 from fastapi import WebSocket
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from .index import WebSocketHandler
 from .manager import manager
-from database import get_db
-from models.index import Message
+from .write_buffer import message_buffer
+from database import AsyncSessionLocal
+from models.index import Conversation
 from models.dtos import MessageRead
 
 
-db: Session = next(get_db())
-handler = WebSocketHandler(db)
+handler = WebSocketHandler(AsyncSessionLocal, manager)
+
+
+async def conversation_room(
+    websocket: WebSocket, conversation_id: int, db: AsyncSession
+) -> Optional[FrozenSet[int]]:
+    """Participants of the conversation, if the socket's user is one of them."""
+    members = manager.room(conversation_id)
+    if members is None:
+        row = (
+            await db.execute(
+                select(Conversation.user_id, Conversation.recipient_id).where(
+                    Conversation.id == conversation_id
+                )
+            )
+        ).first()
+        if not row:
+            return None
+        members = manager.set_room(conversation_id, row)
+
+    if websocket.state.user_id not in members:
+        return None
+    return members
 
 
 @handler.register("message")
-async def handle_message(websocket: WebSocket, data: dict):
-    if "conversation_id" in data:
-        message = Message(
-            sender_id=data["sender_id"],
-            conversation_id=data["conversation_id"],
-            content=data["content"],
-        )
-        db.add(message)
-        db.commit()
-        db.refresh(message)
-
-        message_read = MessageRead.model_validate(message)
-        await manager.broadcast(
-            {"type": "new_message", **message_read.model_dump(mode="json")}
-        )
+async def handle_message(websocket: WebSocket, data: dict, db: AsyncSession):
+    conversation_id = data.get("conversation_id")
+    content = data.get("content")
+    # checked before the batch, a row the insert rejects delays every other
+    # message queued with it
+    if (
+        not isinstance(conversation_id, int)
+        or isinstance(conversation_id, bool)
+        or not isinstance(content, str)
+    ):
+        handler.error(websocket, "Invalid message")
+        return
+
+    members = await conversation_room(websocket, conversation_id, db)
+    if not members:
+        return
+
+    # don't hold a connection while the message waits for its batch
+    await db.close()
+    message = await message_buffer.write(
+        sender_id=websocket.state.user_id,
+        conversation_id=conversation_id,
+        content=content,
+    )
+
+    message_read = MessageRead.model_validate(message)
+    await manager.send_to_users(
+        members, {"type": "new_message", **message_read.model_dump(mode="json")}
+    )
 
 
 @handler.register("typing")
-async def handle_typing(websocket: WebSocket, data: dict):
+async def handle_typing(websocket: WebSocket, data: dict, db: AsyncSession):
     # Example for typing notifications
-    await manager.broadcast(
+    members = await conversation_room(websocket, data["conversation_id"], db)
+    if not members:
+        return
+
+    await manager.send_to_users(
+        members,
         {
             "type": "typing",
-            "user_id": data["user_id"],
+            "user_id": websocket.state.user_id,
             "conversation_id": data["conversation_id"],
-        }
+        },
+        # only the latest typing state matters
+        coalesce_key=("typing", websocket.state.user_id, data["conversation_id"]),
     )
 
 
 @handler.register("not-typing")
-async def handle_typing(websocket: WebSocket, data: dict):
-    await manager.broadcast(
+async def handle_typing(websocket: WebSocket, data: dict, db: AsyncSession):
+    members = await conversation_room(websocket, data["conversation_id"], db)
+    if not members:
+        return
+
+    await manager.send_to_users(
+        members,
         {
             "type": "not-typing",
-            "user_id": data["user_id"],
+            "user_id": websocket.state.user_id,
             "conversation_id": data["conversation_id"],
-        }
+        },
+        # only the latest typing state matters
+        coalesce_key=("typing", websocket.state.user_id, data["conversation_id"]),
     )
@@ -1,9 +1,16 @@
+import logging
 from fastapi import WebSocket
 
+logger = logging.getLogger("app.websocket")
+
 
 class WebSocketHandler:
-    def __init__(self, db_session):
-        self.db = db_session
+    def __init__(self, session_factory, manager):
+        # every message gets its own session; a connection is only checked
+        # out of the pool when a handler actually queries
+        self.session_factory = session_factory
+        # replies with error frames to the socket that sent the message
+        self.manager = manager
         self.handlers = {}
 
     def register(self, message_type: str):
@@ -13,10 +20,24 @@ class WebSocketHandler:
 
         return decorator
 
+    def error(self, websocket: WebSocket, message: str):
+        self.manager.send_to_socket(websocket, {"type": "error", "message": message})
+
     async def handle(self, websocket: WebSocket, data: dict):
         message_type = data.get("type")
         handler = self.handlers.get(message_type)
-        if handler:
-            await handler(websocket, data)
-        else:
-            print(f"No handler for type: {message_type}")
+        if not handler:
+            logger.warning("No handler for type: %s", message_type)
+            self.error(websocket, f"Unknown message type: {message_type}")
+            return
+
+        async with self.session_factory() as db:
+            try:
+                await handler(websocket, data, db)
+            except Exception:
+                # a malformed frame or a database error: the session is
+                # thrown away with the message, the connection and every
+                # other client carry on
+                await db.rollback()
+                logger.exception("Failed to handle %s", message_type)
+                self.error(websocket, f"Failed to handle {message_type}")
@@ -1,21 +1,200 @@
-from fastapi import WebSocket
-import json
+import asyncio
+import os
+from collections import OrderedDict
+from fastapi import WebSocket, status
+from typing import Dict, FrozenSet, Hashable, Iterable, Optional, Set
+
+from utils.websocket import codec
+from utils.websocket.backplane import create_backplane
+
+
+class ClientConnection:
+    """One socket with its own bounded send queue and writer task.
+
+    Sends never wait on the client: messages are queued and written by the
+    writer task, so a slow client only delays itself. Past ``max_queue``
+    pending messages it is a slow consumer: ephemeral messages are dropped
+    and, depending on ``policy``, so are the others ("drop") or the socket
+    is closed so the client reconnects and refetches ("disconnect").
+    """
+
+    def __init__(self, websocket: WebSocket, max_queue: int, policy: str, stats):
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.policy = policy
+        self.stats = stats
+        self.closed = False
+
+        self._queue: asyncio.Queue = asyncio.Queue()
+        # coalesce key -> queued entry, a newer message overwrites it in place
+        self._pending: Dict[Hashable, list] = {}
+        self._writer = asyncio.create_task(self._write())
+        # the event loop only keeps weak references to tasks
+        self._closer: Optional[asyncio.Task] = None
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def offer(self, text: str, coalesce_key: Optional[Hashable] = None):
+        if self.closed:
+            return
+
+        if coalesce_key is not None and coalesce_key in self._pending:
+            self._pending[coalesce_key][1] = text
+            self.stats["coalesced"] += 1
+            return
+
+        if self._queue.qsize() >= self.max_queue:
+            if coalesce_key is not None or self.policy == "drop":
+                self.stats["dropped"] += 1
+                return
+            self.stats["evicted"] += 1
+            self.close(status.WS_1013_TRY_AGAIN_LATER)
+            return
+
+        entry = [coalesce_key, text]
+        if coalesce_key is not None:
+            self._pending[coalesce_key] = entry
+        self._queue.put_nowait(entry)
+
+    async def _write(self):
+        try:
+            while True:
+                coalesce_key, text = entry = await self._queue.get()
+                if self._pending.get(coalesce_key) is entry:
+                    del self._pending[coalesce_key]
+                await self.websocket.send_text(entry[1])
+                self.stats["sent"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # the socket is gone, the receive loop cleans up
+            self.closed = True
+
+    def close(self, code: int = status.WS_1000_NORMAL_CLOSURE):
+        if self.closed:
+            return
+        self.closed = True
+        self._writer.cancel()
+        self._closer = asyncio.create_task(self._close(code))
+
+    async def _close(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+    def stop(self):
+        self.closed = True
+        self._writer.cancel()
 
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
+    def __init__(self, backplane, max_queue: int, policy: str, max_rooms: int = 10000):
+        # forwards events to the sockets connected to other nodes
+        self.backplane = backplane
+        self.max_queue = max_queue
+        self.policy = policy
+        # every open socket of a user, one per tab or device
+        self.connections: Dict[int, Set[ClientConnection]] = {}
+        self._by_socket: Dict[WebSocket, ClientConnection] = {}
+        # conversation id -> participant user ids, they never change
+        self._rooms: "OrderedDict[int, FrozenSet[int]]" = OrderedDict()
+        self.max_rooms = max_rooms
+        self.counters = {"sent": 0, "dropped": 0, "coalesced": 0, "evicted": 0}
 
-    async def connect(self, websocket: WebSocket):
+    async def start(self):
+        await self.backplane.start(self.deliver)
+
+    async def stop(self):
+        await self.backplane.stop()
+
+    async def connect(self, websocket: WebSocket, user_id: int):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        websocket.state.user_id = user_id
+        connection = ClientConnection(
+            websocket, self.max_queue, self.policy, self.counters
+        )
+        self._by_socket[websocket] = connection
+        self.connections.setdefault(user_id, set()).add(connection)
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        connection = self._by_socket.pop(websocket, None)
+        if connection is None:
+            return
+        connection.stop()
+
+        user_id = websocket.state.user_id
+        connections = self.connections.get(user_id, set())
+        connections.discard(connection)
+        if not connections:
+            self.connections.pop(user_id, None)
+
+    def room(self, conversation_id: int) -> Optional[FrozenSet[int]]:
+        members = self._rooms.get(conversation_id)
+        if members is not None:
+            self._rooms.move_to_end(conversation_id)
+        return members
+
+    def set_room(self, conversation_id: int, user_ids: Iterable[int]) -> FrozenSet[int]:
+        members = frozenset(user_ids)
+        self._rooms[conversation_id] = members
+        while len(self._rooms) > self.max_rooms:
+            self._rooms.popitem(last=False)
+        return members
+
+    async def send_to_users(
+        self,
+        user_ids: Iterable[int],
+        message: dict,
+        coalesce_key: Optional[Hashable] = None,
+    ):
+        """Queue ``message`` for every socket of ``user_ids``, on every node.
+
+        Messages sharing a ``coalesce_key`` replace each other while still
+        queued (e.g. typing state), they are also the first to be dropped.
+        """
+        # encoded once, every recipient's queue shares the same frame
+        text = codec.dumps(message)
+        user_ids = list(user_ids)
+        self.deliver(user_ids, text, coalesce_key)
+        await self.backplane.publish(user_ids, text, coalesce_key)
+
+    def send_to_socket(self, websocket: WebSocket, message: dict):
+        """Queue ``message`` for a single socket, e.g. a reply to its own frame."""
+        connection = self._by_socket.get(websocket)
+        if connection is not None:
+            connection.offer(codec.dumps(message))
+
+    def deliver(
+        self, user_ids: Iterable[int], text: str, coalesce_key: Optional[Hashable]
+    ):
+        """Queue an encoded frame for the sockets of ``user_ids`` on this node."""
+        for user_id in user_ids:
+            for connection in list(self.connections.get(user_id, ())):
+                connection.offer(text, coalesce_key)
 
-    async def broadcast(self, message: dict):
-        for connection in self.active_connections:
-            await connection.send_text(json.dumps(message))
+    def stats(self) -> dict:
+        depths = [
+            connection.depth
+            for connections in self.connections.values()
+            for connection in connections
+        ]
+        return {
+            "users": len(self.connections),
+            "connections": len(depths),
+            "max_queue": self.max_queue,
+            "policy": self.policy,
+            "queued": sum(depths),
+            "max_depth": max(depths, default=0),
+            **self.counters,
+            "backplane": self.backplane.stats(),
+        }
 
 
-manager = ConnectionManager()
+manager = ConnectionManager(
+    create_backplane(),
+    max_queue=int(os.environ.get("WS_SEND_QUEUE_SIZE", 256)),
+    policy=os.environ.get("WS_SLOW_CONSUMER_POLICY", "disconnect"),
+)
@@ -0,0 +1,148 @@
+import asyncio
+import os
+from datetime import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import insert
+
+from database import AsyncSessionLocal
+from models.index import Message
+
+
+class MessageWriteBuffer:
+    """Group commit for chat messages.
+
+    ``write`` queues a row and waits; the writer task inserts up to
+    ``max_batch`` queued rows with one multi-row ``INSERT ... RETURNING`` in
+    one transaction, at most ``max_delay`` seconds after the first one came
+    in, and then answers every writer. Nothing is acknowledged before its
+    commit; a failed batch is retried row by row, so a bad row only fails
+    its own writer.
+    """
+
+    def __init__(self, session_factory, max_batch: int, max_delay: float):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+
+        self._pending: List[Tuple[dict, asyncio.Future]] = []
+        self._arrived = asyncio.Event()
+        self._full = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        self.batches = 0
+        self.rows = 0
+        self.largest_batch = 0
+        self.failed_batches = 0
+        self.failed_rows = 0
+
+    async def start(self):
+        self._writer = asyncio.create_task(self._write())
+
+    async def stop(self):
+        # the writer drains what is still queued, then returns
+        self._stopping = True
+        self._arrived.set()
+        self._full.set()
+        if self._writer:
+            await self._writer
+
+    async def write(
+        self, sender_id: int, conversation_id: int, content: str
+    ) -> Message:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(
+            (
+                {
+                    "sender_id": sender_id,
+                    "conversation_id": conversation_id,
+                    "content": content,
+                    # stamped on arrival, batch members keep their order
+                    "created_at": datetime.now(),
+                },
+                future,
+            )
+        )
+        self._arrived.set()
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+        return await future
+
+    async def _write(self):
+        while True:
+            await self._arrived.wait()
+            try:
+                await asyncio.wait_for(self._full.wait(), self.max_delay)
+            except asyncio.TimeoutError:
+                pass
+            await self._flush()
+            if self._stopping and not self._pending:
+                return
+
+    async def _flush(self):
+        batch = self._pending[: self.max_batch]
+        del self._pending[: self.max_batch]
+        if len(self._pending) < self.max_batch:
+            self._full.clear()
+        if not self._pending:
+            self._arrived.clear()
+        if not batch:
+            return
+
+        try:
+            messages = await self._insert([values for values, _ in batch])
+        except Exception:
+            self.failed_batches += 1
+            await self._insert_each(batch)
+            return
+
+        self.batches += 1
+        self.rows += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for (_, future), message in zip(batch, messages):
+            if not future.done():
+                future.set_result(message)
+
+    async def _insert(self, rows: List[dict]) -> List[Message]:
+        async with self.session_factory() as db:
+            messages = (
+                await db.scalars(
+                    insert(Message).returning(Message, sort_by_parameter_order=True),
+                    rows,
+                )
+            ).all()
+            await db.commit()
+            return messages
+
+    async def _insert_each(self, batch: List[Tuple[dict, asyncio.Future]]):
+        for values, future in batch:
+            try:
+                (message,) = await self._insert([values])
+            except Exception as e:
+                self.failed_rows += 1
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            self.rows += 1
+            if not future.done():
+                future.set_result(message)
+
+    def stats(self) -> dict:
+        return {
+            "max_batch": self.max_batch,
+            "max_delay": self.max_delay,
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "rows": self.rows,
+            "average_batch": round(self.rows / self.batches, 2) if self.batches else 0,
+            "largest_batch": self.largest_batch,
+            "failed_batches": self.failed_batches,
+            "failed_rows": self.failed_rows,
+        }
+
+
+message_buffer = MessageWriteBuffer(
+    AsyncSessionLocal,
+    max_batch=int(os.environ.get("MESSAGE_WRITE_BATCH_SIZE", 100)),
+    max_delay=float(os.environ.get("MESSAGE_WRITE_MAX_DELAY_MS", 5)) / 1000,
+)